@@ -2,6 +2,7 @@ from dataclasses import dataclass
 from typing import Generic, TypeVar, Protocol, Optional, Dict, Any, List
 from ksconstants import STATCODE, CMDCODE
 from dataclasses import asdict
+from modbus_transport import ModbusIOError, ILLEGAL_FUNCTION
 
 # ---- 표준 커맨드/상태 ----
 @dataclass
@@ -41,6 +42,7 @@ class Actuator(Generic[ST]):
         self.reg = regmap
         self.now_opid = 0
         self._next_opid = 1
+        self.fc23 = bool(regmap.get("fc23", True))   # 명령 쓰기+상태 읽기를 FC23 한 번으로 (장치가 거부하면 자동으로 끔)
 
     # ---- 하위 클래스가 오버라이드할 것 ----
     def _encode_command(self, cmd: Command) -> List[int]:
@@ -52,28 +54,64 @@ class Actuator(Generic[ST]):
 
     # ---- 공통 I/O ----
 
-    def _read(self, start_addr, cnt) -> List[int]:
-        rr = self.client.read_holding_registers(start_addr, count = cnt, device_id=self.reg['device_id'])
+    # client는 ModbusTransport: 트랜잭션을 큐에 넣고 차례가 오면 보낸다 (timeout = 큐 대기 포함 최대 시간)
+    async def _read(self, start_addr, cnt, timeout: float | None = None) -> List[int]:
+        rr = await self.client.read_holding_registers(start_addr, count = cnt, device_id=self.reg['device_id'], timeout=timeout)
         regs = rr.registers if rr else [0] * cnt
         return regs
 
-    def send(self, cmd: Command) -> int:
+    async def send(self, cmd: Command, timeout: float | None = None) -> int:
         print(f"base send 진입 {cmd}")
         payload = self._encode_command(cmd)
 
         print(f"payload 인코딩 결과 {payload}")
         print(f"cmd_start_addr : {self.reg['cmd_start_addr']} \ndevice_id : {self.reg["device_id"]}")
         # 상태 체크하는건 상태머신에서
-        res = self.client.write_registers(self.reg['cmd_start_addr'], payload, device_id=self.reg["device_id"])
+        res = await self.client.write_registers(self.reg['cmd_start_addr'], payload, device_id=self.reg["device_id"], timeout=timeout)
         # TODO: 명령 보내고 결과를 받아오는 것 구현
         print(res)
         return self.now_opid
     
-    def read_state(self) -> Dict:
+    async def send_verify(self, cmd: Command, timeout: float | None = None) -> tuple[int, Dict]:
+        """
+        명령을 쓰고 바로 상태 블록을 읽어 (opid, 상태)를 돌려준다.
+        FC23(read/write multiple registers)로 한 번에 하고, 장치가 지원하지 않으면 쓰기 → 읽기 두 번으로
+        """
+        payload = self._encode_command(cmd)
         device_id, sa, cnt = self.reg["device_id"], self.reg["state_start_addr"], self.reg["state_cnt"]
-        rr = self._read(sa,cnt)
-        st = self._decode(rr)
-        return asdict(st)
+        print(f"send_verify {cmd} payload {payload} (fc23={self.fc23})")
+        if self.fc23:
+            try:
+                rr = await self.client.readwrite_registers(sa, cnt, self.reg["cmd_start_addr"], payload,
+                                                           device_id=device_id, timeout=timeout)
+                return self.now_opid, self.decode_state(rr.registers)
+            except ModbusIOError as e:
+                if e.exception_code != ILLEGAL_FUNCTION:
+                    raise
+                print(f"device_id {device_id} FC23 미지원 → 쓰기 후 읽기로 전환")
+                self.fc23 = False
+        await self.client.write_registers(self.reg["cmd_start_addr"], payload, device_id=device_id, timeout=timeout)
+        return self.now_opid, await self.read_state(timeout=timeout)
+
+    def build_write(self, cmd: Command, pad_to: int | None = None) -> tuple[int, int, List[int]]:
+        # (slave, 명령 시작주소, 레지스터 값): 여러 구동기 명령을 묶어 쓸 때 사용. opid도 여기서 발급
+        payload = self._encode_command(cmd)
+        if pad_to and len(payload) < pad_to:
+            payload = payload + [0] * (pad_to - len(payload))
+        return self.reg["device_id"], self.reg["cmd_start_addr"], payload
+
+    async def read_state(self, timeout: float | None = None) -> Dict:
+        device_id, sa, cnt = self.reg["device_id"], self.reg["state_start_addr"], self.reg["state_cnt"]
+        rr = await self._read(sa,cnt,timeout)
+        return self.decode_state(rr)
+
+    def state_span(self) -> tuple[int, int, int]:
+        # (slave, 상태 시작주소, 개수) → read_plan으로 같은 slave 상태 블록을 묶어서 읽을 때 사용
+        return self.reg["device_id"], self.reg["state_start_addr"], self.reg["state_cnt"]
+
+    def decode_state(self, regs: List[int]) -> Dict:
+        # 따로 읽었든 묶어서 읽은 블록에서 잘라왔든 같은 디코딩
+        return asdict(self._decode(regs))
 
     def _alloc_opid(self) -> int:
         self.now_opid = self._next_opid
@@ -1,36 +1,220 @@
 # 실행: uvicorn app:app --reload --port 8000
-from fastapi import FastAPI, HTTPException
-from factory import load_conf, build_client, build_actuator
+import sys
+from pathlib import Path
+# 공용 modbus_common 패키지: 컨테이너에서는 /app/modbus_common, 로컬에서는 control_logic/modbus_common
+sys.path.append(str(next((p for p in Path(__file__).resolve().parents if (p / "modbus_common").is_dir()), ".")))
+from fastapi import FastAPI, HTTPException, Header
+from factory import load_conf, build_manager, build_client, build_actuator, actuator_class, gateway_of
+from modbus_common.read_plan import plan_reads
+from write_plan import plan_writes
+from modbus_transport import ModbusIOError
+from modbus_common.modbus_conn import GatewayUnavailable
+from state_poller import StatePoller
 from actuator_base import Command, NutSupplyCommand
-from ksconstants import CMDCODE
+from ksconstants import CMDCODE, STATCODE
 from pydantic import BaseModel
-import asyncio
+import asyncio, os, time
 
 app = FastAPI()
 CONF = load_conf()
-CLIENT = build_client(CONF["connect"]["host"],int(CONF["connect"]["port"]))
-ACTS = {name: build_actuator(name, CLIENT, reg) for name, reg in CONF["devices"].items()}
+# 게이트웨이(host:port)별 연결은 MANAGER가 공유하고 끊기면 backoff를 두고 다시 맺는다.
+# 구역마다 게이트웨이가 다르면 devices.<name>.gateway: "host:port"
+MANAGER = build_manager(CONF["connect"])
+CLIENTS = {}
+ACTS = {}
+for _name, _reg in CONF["devices"].items():
+    _conn = MANAGER.get(*gateway_of(_reg, CONF["connect"]))
+    if _conn.key not in CLIENTS:
+        CLIENTS[_conn.key] = build_client(_conn, float(CONF["connect"].get("timeout", 3)))
+    ACTS[_name] = build_actuator(_name, CLIENTS[_conn.key], _reg)
+    if _conn.probe is None:
+        # 한동안 요청이 없을 때 health check로 읽어볼 레지스터 (게이트웨이의 첫 구동기 상태 블록)
+        _conn.probe = (int(_reg["device_id"]), int(_reg["state_start_addr"]))
+
+def by_gateway(names) -> dict:
+    # 게이트웨이가 다르면 device_id가 같아도 다른 장치라서 읽기/쓰기 계획은 게이트웨이별로 세운다
+    groups = {}
+    for name in names:
+        groups.setdefault(ACTS[name].client.conn.key, []).append(name)
+    return groups
+
+# 같은 slave의 상태 블록을 묶은 읽기 계획 (전체 상태 조회 한 번 = slave당 트랜잭션 1~2개)
+READ_CONF = CONF.get("read_plan") or {}
+READ_PLAN = [req for names in by_gateway(ACTS).values()
+             for req in plan_reads({name: ACTS[name].state_span() for name in names},
+                                   max_gap=int(READ_CONF.get("max_gap", 50)), max_count=int(READ_CONF.get("max_count", 125)))]
+print(f"read plan: {[(r.device_id, r.start, r.count, r.members) for r in READ_PLAN]}")
+WRITE_CONF = CONF.get("write_plan") or {}
+# 게이트웨이가 FC23(쓰기+읽기 한 번에)을 지원하지 않으면 connect.fc23: false (장치별로는 devices.<name>.fc23)
+for _act in ACTS.values():
+    _act.fc23 = _act.fc23 and bool(CONF["connect"].get("fc23", True))
+
+
+# 백그라운드 상태 폴러: get_state는 상태표에서 답한다 (FSM_PUSH_URL이 있으면 값이 바뀔 때 FSM에 밀어줌)
+POLL_CONF = CONF.get("state_poll") or {}
+POLL_MAX_AGE = float(POLL_CONF.get("max_age", 10))
+POLLER: StatePoller | None = None
+
+# 시작 시 전 구동기를 동시에 OFF로 초기화하고 READY(+보낸 opid)가 읽힐 때까지 확인한다
+# 백그라운드에서 돌고 앱(/health, 상태 조회)은 바로 뜬다. 초기화 중인 구동기에는 명령을 받지 않음(503)
+INIT_DEADLINE_SEC = float(os.getenv("INIT_DEADLINE_SEC", "60"))  # 이 안에 READY가 안 읽히면 실패로 보고하고 진행
+INIT_POLL_SEC = float(os.getenv("INIT_POLL_SEC", "1"))
+INIT_REPORT: dict[str, dict] = {}   # 구동기별 status: initializing / ready / failed
+INIT_TASK: asyncio.Task | None = None
+
+async def init_actuator(name: str, act, deadline: float) -> dict:
+    t0 = time.monotonic()
+    rep = INIT_REPORT.setdefault(name, {})
+    rep.update(status="initializing", ready=False, opid=None, state=None, elapsed_sec=None, error=None)
+    opid = None
+    try:
+        # 게이트웨이가 아직 안 붙었거나 응답이 없어도 마감까지 계속 다시 시도한다
+        while True:
+            try:
+                if opid is None:
+                    state = await act.read_state(timeout=deadline - time.monotonic())
+                    act.now_opid = state.get("opid",20001)
+                    if name == "NUTRIENT_PUMP":
+                        opid = await act.send(NutSupplyCommand(name=CMDCODE(0)), timeout=deadline - time.monotonic())
+                    else:
+                        opid = await act.send(Command(name=CMDCODE(0)), timeout=deadline - time.monotonic())
+                    rep["opid"] = opid
+                # 장치가 명령을 받아 READY로 돌아왔는지 다시 읽어 확인
+                st = await act.read_state(timeout=deadline - time.monotonic())
+                rep["state"] = int(st["state"])
+                if st["state"] == STATCODE.READY and st["opid"] == opid:
+                    rep.update(status="ready", ready=True, error=None)
+                    break
+            except (asyncio.TimeoutError, ModbusIOError, GatewayUnavailable) as e:
+                rep["error"] = repr(e)      # 마지막 오류만 남긴다 (마감 전에 READY가 되면 지움)
+            left = deadline - time.monotonic()
+            if left <= 0.1:
+                raise asyncio.TimeoutError(f"not READY within {INIT_DEADLINE_SEC}s (last error: {rep['error']})")
+            await asyncio.sleep(min(INIT_POLL_SEC, left - 0.1))
+    except Exception as e:
+        rep.update(status="failed", error=repr(e))
+        print(f"{name} 초기화 실패: {e!r}")
+    rep["elapsed_sec"] = round(time.monotonic() - t0, 3)
+    return rep
+
+async def init_all():
+    deadline = time.monotonic() + INIT_DEADLINE_SEC
+    reports = await asyncio.gather(*(init_actuator(n, ACTS[n], deadline) for n in ACTS))
+    print(f"구동기 초기화: {sum(r['ready'] for r in reports)}/{len(reports)} READY, "
+          f"{max((r['elapsed_sec'] for r in reports), default=0)}s")
+
+def check_initialized(name: str):
+    # 초기화(OFF 전송 → READY 확인) 중인 구동기에 명령이 섞이면 opid 확인이 꼬인다
+    if INIT_REPORT.get(name, {}).get("status") == "initializing":
+        raise HTTPException(503, f"{name} initializing")
 
 
 @app.on_event("startup")
 async def startup_event():
-    for name, act in ACTS.items():
-        state = act.read_state()
-        act.now_opid = state.get("opid",20001)
-        if name == "NUTRIENT_PUMP":
-            act.send(NutSupplyCommand(name=CMDCODE(0)))
-        else:
-            act.send(Command(name=CMDCODE(0)))
-    await asyncio.sleep(30)  # 30초 대기
+    global POLLER, INIT_TASK
+    # 게이트웨이가 꺼져 있어도 앱은 뜬다 (요청/health check 때 다시 연결)
+    await asyncio.gather(*(cli.start() for cli in CLIENTS.values()))
+    for name in ACTS:
+        INIT_REPORT[name] = {"status": "initializing", "ready": False}
+    INIT_TASK = asyncio.create_task(init_all())
+    if POLL_CONF.get("enabled", True):
+        POLLER = StatePoller(read_states, {name: actuator_class(name) for name in ACTS},
+                             rates=POLL_CONF.get("rates") or {},
+                             fast_interval=float(POLL_CONF.get("fast_interval", 0.5)),
+                             fast_window=float(POLL_CONF.get("fast_window", 10)),
+                             push_url=os.getenv("FSM_PUSH_URL"))
+        POLLER.start()
     print("app startup")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    if INIT_TASK is not None:
+        INIT_TASK.cancel()
+    if POLLER is not None:
+        await POLLER.stop()
+    await asyncio.gather(*(cli.stop() for cli in CLIENTS.values()))
+
+
+def check_deadline(x_timeout_sec: float | None):
+    # 호출한 쪽(FSM)의 남은 시간이 이미 없으면 버스에 손대지 않고 바로 실패
+    if x_timeout_sec is not None and x_timeout_sec <= 0:
+        raise HTTPException(504, "deadline exceeded")
+
+def bus_error(e: Exception) -> HTTPException:
+    # 큐 대기/트랜잭션 시간 초과는 504, 게이트웨이 예외 응답·연결 실패는 502
+    if isinstance(e, asyncio.TimeoutError):
+        return HTTPException(504, str(e) or "modbus timeout")
+    return HTTPException(502, repr(e))
 
 @app.get("/actuators/{name}/get_state")
-def get_state(name: str):
+async def get_state(name: str, x_timeout_sec: float | None = Header(default=None)):
+    check_deadline(x_timeout_sec)
     try:
-        return ACTS[name].read_state()
+        act = ACTS[name]
     except KeyError:
         raise HTTPException(404, f"unknown actuator: {name}")
+    if POLLER is not None and POLLER.age(name) <= POLL_MAX_AGE:
+        return POLLER.get(name)
+    # 폴러가 없거나 값이 오래됐으면 직접 읽고 상태표도 갱신
+    try:
+        st = await act.read_state(timeout=x_timeout_sec)
+    except (asyncio.TimeoutError, ModbusIOError) as e:
+        raise bus_error(e)
+    if POLLER is None:
+        return st
+    POLLER.store(name, st)
+    return POLLER.get(name)
+
+async def read_states(names: set[str] | None = None, timeout: float | None = None) -> tuple[dict, dict]:
+    """읽기 계획대로 블록을 읽고 블록 하나에서 여러 구동기 상태를 디코딩한다."""
+    states, errors = {}, {}
+    reqs = [(req, [m for m in req.members if names is None or m in names]) for req in READ_PLAN]
+    reqs = [(req, members) for req, members in reqs if members]
+    # 블록들을 한꺼번에 큐에 넣는다 (버스에는 하나씩 나감)
+    rrs = await asyncio.gather(*(ACTS[req.members[0]].client.read_holding_registers(req.start, count=req.count,
+                                                                                    device_id=req.device_id, timeout=timeout)
+                                 for req, _ in reqs), return_exceptions=True)
+    for (req, members), rr in zip(reqs, rrs):
+        try:
+            if isinstance(rr, Exception):
+                raise rr
+            regs = rr.registers
+        except Exception as e:
+            print(f"블록 읽기 실패 device_id {req.device_id} {req.start}+{req.count}: {e!r}")
+            for m in members:
+                errors[m] = repr(e)
+            continue
+        for m in members:
+            _, sa, cnt = ACTS[m].state_span()
+            try:
+                states[m] = ACTS[m].decode_state(req.slice(regs, sa, cnt))
+            except Exception as e:
+                errors[m] = repr(e)
+    return states, errors
+
+@app.get("/actuators/state")
+async def get_states(names: str | None = None, x_timeout_sec: float | None = Header(default=None)):
+    # 전체(또는 names=FAN,CO2) 구동기 상태를 slave별 묶음 읽기로 한 번에
+    check_deadline(x_timeout_sec)
+    # 없는 구동기명은 404가 아니라 errors에 이름별로 (404/405는 "이 엔드포인트 자체가 없음"으로만 쓴다)
+    wanted = {n for n in (names or "").split(",") if n} or None
+    unknown = {n: "unknown actuator" for n in (wanted or set()) - ACTS.keys()}
+    if wanted:
+        wanted = wanted & ACTS.keys()
+        if not wanted:
+            return {"states": {}, "errors": unknown}
+    targets = wanted or set(ACTS)
+    if POLLER is None:
+        states, errors = await read_states(wanted, timeout=x_timeout_sec)
+        return {"states": states, "errors": {**errors, **unknown}}
+    stale = {n for n in targets if POLLER.age(n) > POLL_MAX_AGE}
+    errors = {}
+    if stale:
+        fresh, errors = await read_states(stale, timeout=x_timeout_sec)
+        for n, st in fresh.items():
+            POLLER.store(n, st)
+    states = {n: POLLER.get(n) for n in targets if n not in errors and POLLER.get(n) is not None}
+    return {"states": states, "errors": {**errors, **unknown}}
 
 class CommandIn(BaseModel):
     cmd_name: str
@@ -38,27 +222,113 @@ class CommandIn(BaseModel):
     ec: float | None = None
     ph: float | None = None
 
-@app.post("/actuators/{name}/send_command")
-def post_command(name: str, body: CommandIn):
-    try:
-        act = ACTS[name]
-    except KeyError:
-        raise HTTPException(404, f"unknown actuator: {name}")
-    print(body)
+def make_command(name: str, body: CommandIn) -> Command:
     # 장치별 추가 인자 처리
     if name in {"SKY_WINDOW_LEFT","SKY_WINDOW_RIGHT","SHADING_SCREEN","HEAT_CURTAIN"}:
-        opid = act.send(Command(name=CMDCODE[body.cmd_name], duration_sec=body.duration_sec or 0))
+        return Command(name=CMDCODE[body.cmd_name], duration_sec=body.duration_sec or 0)
     elif name == "NUTRIENT_PUMP":
-        opid = act.send(NutSupplyCommand(name=CMDCODE[body.cmd_name], 
+        return NutSupplyCommand(name=CMDCODE[body.cmd_name], 
                                 duration_sec=body.duration_sec or 0,
                                 ec=body.ec,
                                 ph=body.ph
                                 )
-                        )
-    else:
-        opid = act.send(Command(name=CMDCODE[body.cmd_name], duration_sec=body.duration_sec or 0))
-    return {"opid": opid}
+    return Command(name=CMDCODE[body.cmd_name], duration_sec=body.duration_sec or 0)
+
+@app.post("/actuators/{name}/send_command")
+async def post_command(name: str, body: CommandIn, verify: bool = False, x_timeout_sec: float | None = Header(default=None)):
+    # verify=true면 명령 직후 읽은 상태 블록도 같이 돌려준다 (opid 반영 여부를 다음 get_state 없이 확인)
+    check_deadline(x_timeout_sec)
+    try:
+        act = ACTS[name]
+    except KeyError:
+        raise HTTPException(404, f"unknown actuator: {name}")
+    check_initialized(name)
+    print(body)
+    cmd = make_command(name, body)
+    state = None
+    try:
+        if verify:
+            opid, state = await act.send_verify(cmd, timeout=x_timeout_sec)
+        else:
+            opid = await act.send(cmd, timeout=x_timeout_sec)
+    except (asyncio.TimeoutError, ModbusIOError) as e:
+        raise bus_error(e)
+    if POLLER is not None:
+        if state is not None:
+            POLLER.store(name, state)
+        POLLER.kick(name)   # 명령 결과(opid 반영, 동작 시작)를 빨리 보도록
+    if state is None:
+        return {"opid": opid}
+    return {"opid": opid, "state": POLLER.get(name) if POLLER is not None else state}
+
+class CommandsIn(BaseModel):
+    commands: dict[str, CommandIn]   # 구동기명 → 명령
+
+@app.post("/actuators/send_commands")
+async def post_commands(body: CommandsIn, x_timeout_sec: float | None = Header(default=None)):
+    """
+    여러 구동기 명령을 slave별로 모아 틈 없이 이어지는 명령 블록은 한 번의 write_registers로 보낸다.
+    합친 쓰기가 실패하면 구동기별로 따로 다시 보낸다. 결과는 구동기별로
+    """
+    check_deadline(x_timeout_sec)
+    unknown = body.commands.keys() - ACTS.keys()
+    if unknown:
+        raise HTTPException(404, f"unknown actuator: {','.join(sorted(unknown))}")
+    results, errors = {}, {}
+    writes, opids = {}, {}
+    pad = bool(WRITE_CONF.get("pad_cmd_blocks", False))
+    for name, cmd_in in body.commands.items():
+        act = ACTS[name]
+        if INIT_REPORT.get(name, {}).get("status") == "initializing":
+            errors[name] = "initializing"
+            continue
+        try:
+            writes[name] = act.build_write(make_command(name, cmd_in), pad_to=act.reg.get("cmd_cnt") if pad else None)
+            opids[name] = act.now_opid
+        except Exception as e:
+            errors[name] = repr(e)
+    plan = [req for names in by_gateway(writes).values()
+            for req in plan_writes({name: writes[name] for name in names}, merge=bool(WRITE_CONF.get("merge", True)),
+                                   max_count=int(WRITE_CONF.get("max_count", 123)))]
+    print(f"일괄 명령 {list(body.commands)} → 쓰기 {len(plan)}번 {[(w.device_id, w.start, len(w.values), w.members) for w in plan]}")
+
+    async def run(req):
+        client = ACTS[req.members[0]].client
+        try:
+            await client.write_registers(req.start, req.values, device_id=req.device_id, timeout=x_timeout_sec)
+            return {m: None for m in req.members}
+        except Exception as e:
+            if len(req.members) == 1:
+                return {req.members[0]: e}
+            print(f"묶음 쓰기 실패 device_id {req.device_id} {req.start}+{len(req.values)} → 개별 전송: {e!r}")
+        outs = {}
+        for m in req.members:
+            device_id, start, values = writes[m]
+            try:
+                await client.write_registers(start, values, device_id=device_id, timeout=x_timeout_sec)
+                outs[m] = None
+            except Exception as e:
+                outs[m] = e
+        return outs
+
+    for outs in await asyncio.gather(*(run(req) for req in plan)):
+        for name, err in outs.items():
+            if err is None:
+                results[name] = {"opid": opids[name]}
+                if POLLER is not None:
+                    POLLER.kick(name)
+            else:
+                errors[name] = bus_error(err).detail
+    return {"results": results, "errors": errors, "writes": len(plan)}
 
 @app.get("/health")
 def health():
-    return {"ok": True}
\ No newline at end of file
+    return {
+        "ok": True,
+        "ready": bool(INIT_REPORT) and all(r["ready"] for r in INIT_REPORT.values()),
+        "initializing": sorted(n for n, r in INIT_REPORT.items() if r["status"] == "initializing"),
+        "init": INIT_REPORT,
+        "modbus": {key: cli.stats() for key, cli in CLIENTS.items()},
+        "gateways": MANAGER.stats(),
+        "state_poll": POLLER.stats() if POLLER is not None else None,
+    }
\ No newline at end of file
@@ -1,23 +1,49 @@
-import yaml
+import os, yaml
 from pathlib import Path
-from pymodbus.client import ModbusTcpClient
+from modbus_transport import ModbusTransport
+from modbus_common.modbus_conn import ConnectionManager, GatewayConnection, parse_gateway
 from switch_actuator import SwitchActuator
 from retractable_actuator import RetractableActuator
 from nutsupply_actuator import NutSupplyActuator
 
 def load_conf(path="act_conf.yaml") -> dict:
-    return yaml.safe_load(Path(path).read_text(encoding="utf-8"))
+    conf = yaml.safe_load(Path(path).read_text(encoding="utf-8"))
+    # compose에서는 MODBUS_IP/MODBUS_PORT 로 modbus_broker를 가리킨다 (connect.host/port 보다 우선)
+    connect = conf.setdefault("connect", {})
+    connect["host"] = os.getenv("MODBUS_IP", connect.get("host"))
+    connect["port"] = int(os.getenv("MODBUS_PORT", connect.get("port", 502)))
+    return conf
 
-def build_client(host="192.168.0.10", port=502):
-    cli = ModbusTcpClient(host=host, port=port)
-    assert cli.connect(), "Modbus connect failed"
-    return cli
+def build_manager(connect: dict) -> ConnectionManager:
+    # 게이트웨이 연결 공통 설정 (connect 섹션)
+    return ConnectionManager(timeout=float(connect.get("timeout", 3)),
+                             backoff_min=float(connect.get("backoff_min", 0.5)),
+                             backoff_max=float(connect.get("backoff_max", 30)),
+                             max_failures=int(connect.get("max_failures", 3)),
+                             health_interval=float(connect.get("health_interval", 10)))
 
-def build_actuator(kind: str, client, reg: dict):
+def gateway_of(reg: dict, connect: dict) -> tuple[str, int]:
+    # 장치별 gateway: "host:port"가 있으면 그 게이트웨이, 없으면 connect의 기본 게이트웨이
+    return parse_gateway(reg.get("gateway"), int(connect.get("port", 502))) or (connect["host"], int(connect["port"]))
+
+def build_client(conn: GatewayConnection, timeout=3):
+    # 게이트웨이 하나당 트랜잭션 큐 하나. 연결은 앱 시작 때 await cli.start()
+    return ModbusTransport(conn, timeout=timeout)
+
+def actuator_class(kind: str) -> str:
+    # 장치 종류 (상태 폴링 주기 등 종류별 설정에 사용)
     if kind in {"FCU_FAN","FCU_PUMP","CO2","FAN","FOG"}:
-        return SwitchActuator(client, reg)
+        return "switch"
     if kind in {"SKY_WINDOW_LEFT","SKY_WINDOW_RIGHT","SHADING_SCREEN","HEAT_CURTAIN"}:
-        return RetractableActuator(client, reg)
+        return "retractable"
     if kind in {"NUTRIENT_PUMP"}:
-        return NutSupplyActuator(client, reg)
+        return "nutsupply"
     raise ValueError(f"unknown device kind: {kind}")
+
+def build_actuator(kind: str, client, reg: dict):
+    cls = actuator_class(kind)
+    if cls == "switch":
+        return SwitchActuator(client, reg)
+    if cls == "retractable":
+        return RetractableActuator(client, reg)
+    return NutSupplyActuator(client, reg)
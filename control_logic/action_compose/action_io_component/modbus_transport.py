@@ -0,0 +1,147 @@
+import asyncio, itertools, time
+from typing import Awaitable, Callable
+from pymodbus.client import AsyncModbusTcpClient
+from pymodbus.exceptions import ModbusException
+from modbus_common.modbus_conn import GatewayConnection, GatewayUnavailable
+
+# 우선순위: 숫자가 작을수록 먼저 (명령은 대기중인 상태 읽기보다 앞에 끼어든다)
+PRIORITY_COMMAND = 0
+PRIORITY_READ = 10
+
+# Modbus 예외 코드: 장치가 이 function code를 지원하지 않음
+ILLEGAL_FUNCTION = 1
+
+class ModbusIOError(Exception):
+    """게이트웨이가 예외 응답을 주거나 연결이 안 될 때 (exception_code: Modbus 예외 코드, 없으면 None)"""
+    def __init__(self, msg: str, exception_code: int | None = None):
+        super().__init__(msg)
+        self.exception_code = exception_code
+
+
+class ModbusTransport:
+    """
+    게이트웨이 연결(GatewayConnection) 하나 위로 트랜잭션을 우선순위 큐로 한 번에 하나씩 흘려보낸다.
+    여러 엔드포인트가 동시에 불러도 소켓 위에서 요청/응답이 섞이지 않고,
+    트랜잭션마다 마감 시간이 있어 큐에서 오래 기다린 요청은 버스에 나가기 전에 버린다.
+    연결이 끊기면 GatewayConnection이 backoff를 두고 다시 붙는다.
+    """
+    def __init__(self, conn: GatewayConnection, timeout: float = 3.0):
+        self.conn = conn
+        self.host = conn.host
+        self.port = conn.port
+        self.timeout = timeout          # 트랜잭션 하나의 기본 최대 대기(초)
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._seq = itertools.count()   # 같은 우선순위는 들어온 순서대로
+        self._worker: asyncio.Task | None = None
+        conn.prober = self._probe       # health check도 이 큐를 거쳐 명령/상태 읽기와 섞이지 않게
+        # 메트릭
+        self.done = 0
+        self.errors = 0
+        self.expired = 0                # 큐에서 기다리다 마감이 지나 보내지 않은 수
+        self.max_wait_sec = 0.0
+        self.last_latency_sec = 0.0
+
+    @property
+    def client(self) -> AsyncModbusTcpClient | None:
+        return self.conn.client
+
+    async def start(self):
+        await self.conn.start()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+        while not self._queue.empty():
+            *_, fut = self._queue.get_nowait()
+            if not fut.done():
+                fut.cancel()
+        await self.conn.stop()
+
+    def stats(self) -> dict:
+        return {
+            "connected": self.conn.connected,
+            "gateway": self.conn.key,
+            "queued": self._queue.qsize(),
+            "done": self.done,
+            "errors": self.errors,
+            "expired": self.expired,
+            "max_wait_sec": round(self.max_wait_sec, 3),
+            "last_latency_sec": round(self.last_latency_sec, 3),
+        }
+
+    # ---- pymodbus 클라이언트와 같은 이름의 호출 (응답 객체를 그대로 돌려줌) ----
+    async def read_holding_registers(self, address: int, count: int = 1, device_id: int = 1,
+                                     timeout: float | None = None, priority: int = PRIORITY_READ):
+        return await self.submit(lambda c: c.read_holding_registers(address, count=count, device_id=device_id),
+                                 priority=priority, timeout=timeout)
+
+    async def write_registers(self, address: int, values: list[int], device_id: int = 1,
+                              timeout: float | None = None, priority: int = PRIORITY_COMMAND):
+        return await self.submit(lambda c: c.write_registers(address, values, device_id=device_id),
+                                 priority=priority, timeout=timeout)
+
+    async def readwrite_registers(self, read_address: int, read_count: int, write_address: int, values: list[int],
+                                  device_id: int = 1, timeout: float | None = None, priority: int = PRIORITY_COMMAND):
+        # FC23: 쓰기를 먼저 하고 같은 트랜잭션에서 읽은 값을 돌려준다
+        return await self.submit(lambda c: c.readwrite_registers(read_address=read_address, read_count=read_count,
+                                                             write_address=write_address, values=values,
+                                                             device_id=device_id),
+                                 priority=priority, timeout=timeout)
+
+    async def _probe(self, device_id: int, address: int):
+        # 큐 맨 뒤(읽기 우선순위)에서 레지스터 하나를 읽어본다
+        await self.read_holding_registers(address, count=1, device_id=device_id, priority=PRIORITY_READ)
+
+    async def submit(self, call: Callable[[AsyncModbusTcpClient], Awaitable], priority: int = PRIORITY_READ,
+                     timeout: float | None = None):
+        """
+        call: 연결된 클라이언트를 받아 실제 pymodbus 호출을 만드는 함수. timeout은 큐 대기 + 트랜잭션 전체 시간(초)
+        """
+        budget = self.timeout if timeout is None else min(self.timeout, timeout)
+        if budget <= 0:
+            raise asyncio.TimeoutError("deadline exceeded before queueing")
+        fut = asyncio.get_running_loop().create_future()
+        deadline = time.monotonic() + budget
+        self._queue.put_nowait((priority, next(self._seq), deadline, time.monotonic(), call, fut))
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        return await fut
+
+    async def _run(self):
+        while True:
+            priority, _, deadline, queued_at, call, fut = await self._queue.get()
+            if fut.done():          # 호출한 쪽이 이미 포기함
+                continue
+            now = time.monotonic()
+            self.max_wait_sec = max(self.max_wait_sec, now - queued_at)
+            if now >= deadline:
+                self.expired += 1
+                fut.set_exception(asyncio.TimeoutError("deadline exceeded in modbus queue"))
+                continue
+            try:
+                try:
+                    client = await asyncio.wait_for(self.conn.ensure(), deadline - now)
+                except GatewayUnavailable as e:
+                    raise ModbusIOError(str(e))
+                try:
+                    rr = await asyncio.wait_for(call(client), max(0.0, deadline - time.monotonic()))
+                except (asyncio.TimeoutError, ModbusException, OSError) as e:
+                    # 응답이 없거나 소켓이 끊김 → 연속으로 쌓이면 연결을 버리고 다시 맺는다
+                    self.conn.record_failure(e)
+                    raise
+                self.conn.record_success()
+                if rr.isError():
+                    raise ModbusIOError(f"modbus error response: {rr}", getattr(rr, "exception_code", None))
+            except (asyncio.TimeoutError, ModbusIOError, ModbusException, OSError) as e:
+                self.errors += 1
+                if not isinstance(e, (asyncio.TimeoutError, ModbusIOError)):
+                    e = ModbusIOError(repr(e))
+                if not fut.done():
+                    fut.set_exception(e)
+                continue
+            self.done += 1
+            self.last_latency_sec = time.monotonic() - now
+            if not fut.done():
+                fut.set_result(rr)
@@ -1,30 +1,32 @@
 from typing import List, Dict
 from actuator_base import Actuator, NutSupplyCommand, NutSupplyState
 from ksconstants import STATCODE
-from utils import pack_i32, unpack_f32, unpack_i32, pack_f32
+from modbus_common.regcodec import compile_offsets
 
 STATUS = {"state":0, "area":1, "alarm":2, "opid":3, "remain":[4,5]}
 CMD    = {"cmd":0, "opid":1, "start_area":2, "end_area":3, "time":[4,5], "ec":[6,7], "ph":[8,9]}
 
+STATUS_CODEC = compile_offsets(STATUS)
+CMD_CODEC = compile_offsets(CMD, dtypes={"ec": "float32", "ph": "float32"})
+
 
 class NutSupplyActuator(Actuator[NutSupplyState]):
     def _encode_command(self, cmd: NutSupplyCommand) -> List[int]:
         opid = self._alloc_opid()
         # start_area, end_area는 1로 고정
+        regs = CMD_CODEC.encode({"cmd": cmd.name.value, "opid": opid, "start_area": 1, "end_area": 1,
+                                 "time": int(cmd.duration_sec or 0), "ec": cmd.ec, "ph": cmd.ph})
         if cmd.ec is not None and cmd.ph is not None:
-            return [cmd.name.value, opid, 1, 1, 
-                    *pack_i32(int(cmd.duration_sec or 0)), 
-                    *pack_f32(cmd.ec),
-                    *pack_f32(cmd.ph)
-                    ]
-        return [cmd.name.value, opid, 1, 1, *pack_i32(int(cmd.duration_sec or 0))]
+            return regs
+        return regs[:6]
 
     def _decode(self, regs: List[int]) -> NutSupplyState:
+        st = STATUS_CODEC.decode(regs)
         return NutSupplyState(
-            state=STATCODE(regs[STATUS["state"]]),
-            area=regs[STATUS["area"]],
-            alarm=regs[STATUS["alarm"]],
-            opid=regs[STATUS["opid"]],
-            remain_sec=unpack_i32(regs[STATUS["remain"][0]],regs[STATUS["remain"][1]])
+            state=STATCODE(st["state"]),
+            area=st["area"],
+            alarm=st["alarm"],
+            opid=st["opid"],
+            remain_sec=st["remain"]
         )
 
@@ -1,11 +1,14 @@
 from typing import List
-from utils import pack_i32, unpack_i32
 from actuator_base import Actuator, Command, RetractableState
 from ksconstants import STATCODE
+from modbus_common.regcodec import compile_offsets
 
 STATUS = {"state":1, "opid":0, "remain":[2,3], "open_pct":4}
 CMD    = {"cmd":0, "opid":1, "duration":[2,3], "target_pct":4}
 
+STATUS_CODEC = compile_offsets(STATUS)
+CMD_CODEC = compile_offsets(CMD)
+
 class RetractableActuator(Actuator[RetractableState]):
     def _encode_command(self, cmd: Command) -> List[int]:
         print(f"_encode_command in : cmd {cmd}")
@@ -15,22 +18,19 @@ class RetractableActuator(Actuator[RetractableState]):
         except Exception:
             print("opid 발급 에러")
         # TODO cmd가 시간열림 혹은 시간 닫힘인데 duration_sec가 0이면 에러
-        if cmd.duration_sec:
-            print([cmd.name.value, opid, *pack_i32(int(cmd.duration_sec or 0))])
-            return [cmd.name.value, opid, *pack_i32(int(cmd.duration_sec or 0))]
-        print([cmd.name.value, opid, *pack_i32(int(cmd.duration_sec or 0))])
-        return [cmd.name.value, opid, *pack_i32(int(cmd.duration_sec or 0))]
+        # target_pct는 아직 쓰지 않으므로 앞 4개 레지스터(cmd, opid, duration)만 보낸다
+        regs = CMD_CODEC.encode({"cmd": cmd.name.value, "opid": opid, "duration": int(cmd.duration_sec or 0)})[:4]
+        print(regs)
+        return regs
 
     def _decode(self, regs: List[int]) -> RetractableState:
         # TODO 로그
+        st = STATUS_CODEC.decode(regs)
         return RetractableState(
-                state=STATCODE(regs[STATUS["state"]]), 
-                opid=regs[STATUS["opid"]], 
-                remain_sec=unpack_i32(
-                    regs[STATUS["remain"][0]],
-                    regs[STATUS["remain"][1]]
-                ),
-                open_pct=regs[STATUS["open_pct"]]
+                state=STATCODE(st["state"]), 
+                opid=st["opid"], 
+                remain_sec=st["remain"],
+                open_pct=st["open_pct"]
         )
 
     # TODO 좌우천장은 따로 구현 해야함
\ No newline at end of file
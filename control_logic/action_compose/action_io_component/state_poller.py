@@ -0,0 +1,137 @@
+import asyncio, time
+from typing import Awaitable, Callable
+import httpx
+from ksconstants import STATCODE
+
+# 이 상태면 곧 바뀔 테니 빠른 주기로 읽는다
+BUSY_CODES = {STATCODE.OPENING, STATCODE.CLOSING, STATCODE.PREPARING, STATCODE.SUPPLYING, STATCODE.FINISHING}
+
+class StatePoller:
+    """
+    구동기 상태를 백그라운드에서 한 번만 읽어 메모리 상태표에 쌓아둔다.
+    get_state 요청 수가 아니라 장치 수만큼만 버스를 쓴다.
+    - 평상시: 장치 종류별 주기(rates)
+    - 명령 직후(fast_window초) 또는 동작중(여닫는 중/급액중): fast_interval
+    - 남은 구동시간(remain_sec)만 있는 경우: 평상 주기 + 끝날 예정 시각에 한 번
+    상태표 항목: {"state": {...}, "ts": 읽은 시각(epoch), "version": 값이 바뀔 때마다 +1}
+    """
+    def __init__(self, read_fn: Callable[[set[str]], Awaitable[tuple[dict, dict]]], classes: dict[str, str],
+                 rates: dict[str, float], default_rate: float = 5.0, fast_interval: float = 0.5,
+                 fast_window: float = 10.0, push_url: str | None = None):
+        self.read_fn = read_fn                  # read_fn(names) -> (states, errors)
+        self.classes = classes                  # 장치명 → 종류 (switch / retractable / nutsupply)
+        self.rates = rates
+        self.default_rate = default_rate
+        self.fast_interval = fast_interval
+        self.fast_window = fast_window
+        self.push_url = push_url.rstrip("/") if push_url else None   # 값이 바뀌면 FSM에 밀어줄 주소
+        self.table: dict[str, dict] = {}
+        self.version = 0                        # 상태표 전체 버전
+        self.errors: dict[str, str] = {}       # 장치별 마지막 읽기 실패
+        self.reads = 0                          # read_fn 호출 수
+        self._mono: dict[str, float] = {}       # 장치별 마지막 읽은 시각(time.monotonic())
+        self._due: dict[str, float] = {name: 0.0 for name in classes}
+        self._fast_until: dict[str, float] = {}
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._pushes: set[asyncio.Task] = set()     # 진행 중인 푸시 (참조를 들고 있어야 중간에 GC되지 않음)
+        self._http: httpx.AsyncClient | None = None
+
+    def start(self):
+        if self.push_url and self._http is None:
+            self._http = httpx.AsyncClient(timeout=2)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+        for t in list(self._pushes):
+            t.cancel()
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    def kick(self, name: str):
+        """명령을 보낸 직후 호출: fast_window 동안 빠르게, 지금 바로 한 번 읽는다."""
+        now = time.monotonic()
+        self._fast_until[name] = now + self.fast_window
+        self._due[name] = now
+        self._wake.set()
+
+    def get(self, name: str) -> dict | None:
+        """상태표 값 + age_sec/version. 아직 읽은 적 없으면 None"""
+        ent = self.table.get(name)
+        if ent is None:
+            return None
+        return {**ent["state"], "age_sec": round(self.age(name), 3), "version": ent["version"]}
+
+    def age(self, name: str) -> float:
+        return time.monotonic() - self._mono[name] if name in self._mono else float("inf")
+
+    def store(self, name: str, st: dict):
+        """읽은 상태를 상태표에 반영 (직접 읽은 경우도 여기로)"""
+        self._mono[name] = time.monotonic()
+        self.errors.pop(name, None)
+        ent = self.table.get(name)
+        if ent is not None and ent["state"] == st:
+            ent["ts"] = time.time()
+            return
+        self.version += 1
+        self.table[name] = {"state": st, "ts": time.time(), "version": self.version}
+        if self.push_url:
+            task = asyncio.create_task(self._push(name))
+            self._pushes.add(task)
+            task.add_done_callback(self._pushes.discard)
+
+    def interval(self, name: str) -> float:
+        ent = self.table.get(name)
+        busy = ent is not None and ent["state"].get("state") in BUSY_CODES
+        if busy or time.monotonic() < self._fast_until.get(name, 0.0):
+            return self.fast_interval
+        slow = float(self.rates.get(self.classes.get(name), self.default_rate))
+        # 시간 구동(ON 상태로 remain_sec가 줄어드는 중)은 평상 주기로 두고, 끝날 무렵에 한 번 더 읽는다
+        remain = (ent["state"].get("remain_sec") or 0) - self.age(name) if ent is not None else 0
+        if 0 < remain < slow:
+            return max(self.fast_interval, remain)
+        return slow
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "reads": self.reads,
+            "errors": dict(self.errors),
+            "age_sec": {name: round(self.age(name), 3) for name in self._mono},
+            "interval_sec": {name: self.interval(name) for name in self.classes},
+        }
+
+    async def _push(self, name: str):
+        if self._http is None:
+            return
+        try:
+            await self._http.post(f"{self.push_url}/devices/{name}/state", json=self.get(name))
+        except Exception as e:
+            print(f"FSM 상태 푸시 실패 {name}: {e!r}")
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            due = {name for name, t in self._due.items() if t <= now}
+            if due:
+                self.reads += 1
+                try:
+                    states, errors = await self.read_fn(due)
+                except Exception as e:
+                    states, errors = {}, {name: repr(e) for name in due}
+                for name, st in states.items():
+                    self.store(name, st)
+                for name, err in errors.items():
+                    self.errors[name] = err
+                for name in due:
+                    self._due[name] = time.monotonic() + self.interval(name)
+            self._wake.clear()
+            wait = min(self._due.values(), default=now + self.default_rate) - time.monotonic()
+            try:
+                await asyncio.wait_for(self._wake.wait(), max(0.05, wait))
+            except asyncio.TimeoutError:
+                pass
@@ -1,9 +1,13 @@
-from utils import pack_i32, unpack_i32
 from typing import List, Dict
 from actuator_base import Actuator, BaseState, Command
 from ksconstants import STATCODE
+from modbus_common.regcodec import compile_offsets
 
 STATUS = {"state":1, "opid":0, "remain":[2,3]}
+CMD    = {"cmd":0, "opid":1, "duration":[2,3]}
+
+STATUS_CODEC = compile_offsets(STATUS)
+CMD_CODEC = compile_offsets(CMD)
 
 class SwitchActuator(Actuator[BaseState]):
     def _encode_command(self, cmd: Command) -> List[int]:
@@ -11,13 +15,15 @@ class SwitchActuator(Actuator[BaseState]):
         opid = self._alloc_opid()
         print(opid)
         print(cmd.duration_sec)
+        regs = CMD_CODEC.encode({"cmd": cmd.name.value, "opid": opid, "duration": int(cmd.duration_sec or 0)})
         if cmd.duration_sec:
-            return [cmd.name.value, opid, *pack_i32(int(cmd.duration_sec or 0))]
-        return [cmd.name.value, opid]
+            return regs
+        return regs[:2]
     
     def _decode(self, regs: List[int]) -> BaseState:
         # TODO 로그
         print(regs)
-        return BaseState(state=STATCODE(regs[STATUS["state"]]), opid=regs[0], remain_sec=unpack_i32(regs[STATUS["remain"][0]],regs[STATUS["remain"][1]]))
+        st = STATUS_CODEC.decode(regs)
+        return BaseState(state=STATCODE(st["state"]), opid=st["opid"], remain_sec=st["remain"])
 
 
@@ -0,0 +1,43 @@
+from dataclasses import dataclass, field
+
+# FC16(write multiple registers) 한 번에 쓸 수 있는 최대 레지스터 수
+MAX_WRITE_COUNT = 123
+
+@dataclass
+class WriteRequest:
+    device_id: int
+    start: int
+    values: list[int] = field(default_factory=list)
+    members: list[str] = field(default_factory=list)   # 이 쓰기에 담긴 구동기 이름
+
+    @property
+    def end(self) -> int:
+        return self.start + len(self.values)
+
+
+def plan_writes(writes: dict[str, tuple[int, int, list[int]]], merge: bool = True,
+                max_count: int = MAX_WRITE_COUNT) -> list[WriteRequest]:
+    """
+    writes: 이름 → (device_id, 명령 시작주소, 레지스터 값)
+    같은 slave에서 앞 명령이 끝나는 주소에서 바로 다음 명령이 시작하면(틈 없이 붙어 있으면)
+    하나의 write_registers로 합친다. 사이에 빈 레지스터가 있으면 덮어쓸 수 없으니 합치지 않는다.
+    """
+    by_dev: dict[int, list[tuple[int, list[int], str]]] = {}
+    for name, (device_id, start, values) in writes.items():
+        by_dev.setdefault(int(device_id), []).append((int(start), list(values), name))
+
+    plan: list[WriteRequest] = []
+    for device_id in sorted(by_dev):
+        cur: WriteRequest | None = None
+        for start, values, name in sorted(by_dev[device_id], key=lambda w: w[0]):
+            if (merge and cur is not None and start == cur.end
+                    and len(cur.values) + len(values) <= max_count):
+                cur.values.extend(values)
+                cur.members.append(name)
+                continue
+            if cur is not None:
+                plan.append(cur)
+            cur = WriteRequest(device_id, start, values, [name])
+        if cur is not None:
+            plan.append(cur)
+    return plan
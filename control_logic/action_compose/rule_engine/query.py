@@ -1,6 +1,6 @@
 def get_query() -> str:
   return """WITH base AS (
-  SELECT * FROM greenhouse2 ORDER BY time DESC LIMIT 1
+  SELECT * FROM greenhouse2_dense ORDER BY time DESC LIMIT 1
 ),
 b AS (
   SELECT *,
@@ -13,14 +13,14 @@ SELECT
   b.time,
   CASE WHEN b.all_zero3 THEN COALESCE((
     SELECT p.indoor_temp
-    FROM greenhouse2 p
+    FROM greenhouse2_dense p
     WHERE p.time <= b.time AND p.time > b.time - interval '30 minutes'
       AND COALESCE(p.indoor_temp,0) <> 0
     ORDER BY p.time DESC LIMIT 1
   ), b.indoor_temp) ELSE b.indoor_temp END AS indoor_temp,
   CASE WHEN b.all_zero3 THEN COALESCE((
     SELECT p.indoor_humidity
-    FROM greenhouse2 p
+    FROM greenhouse2_dense p
     WHERE p.time <= b.time AND p.time > b.time - interval '30 minutes'
       AND COALESCE(p.indoor_humidity,0) <> 0
     ORDER BY p.time DESC LIMIT 1
@@ -28,7 +28,7 @@ SELECT
   b.rain, b.wind_speed, b.outdoor_temp, b.solar_radiation,
   CASE WHEN b.all_zero3 THEN COALESCE((
     SELECT p.indoor_co2
-    FROM greenhouse2 p
+    FROM greenhouse2_dense p
     WHERE p.time <= b.time AND p.time > b.time - interval '30 minutes'
       AND COALESCE(p.indoor_co2,0) <> 0
     ORDER BY p.time DESC LIMIT 1
@@ -37,7 +37,7 @@ SELECT
   CASE 
     WHEN b.soil_water_content = 0 THEN COALESCE((
       SELECT p.soil_water_content
-      FROM greenhouse2 p
+      FROM greenhouse2_dense p
       WHERE p.time <= b.time AND p.time > b.time - interval '30 minutes'
         AND p.soil_water_content <> 0
       ORDER BY p.time DESC
@@ -45,14 +45,14 @@ SELECT
     ), b.soil_water_content)
     WHEN ABS(b.soil_water_content - (
       SELECT p.soil_water_content
-      FROM greenhouse2 p
+      FROM greenhouse2_dense p
       WHERE p.time < b.time
       ORDER BY p.time DESC
       LIMIT 1
     )) >= 10
     THEN (
       SELECT p.soil_water_content
-      FROM greenhouse2 p
+      FROM greenhouse2_dense p
       WHERE p.time < b.time
       ORDER BY p.time DESC
       LIMIT 1
@@ -10,6 +10,7 @@ import requests,os
 app = FastAPI()
 
 FSM_HOST_BASE = os.getenv("FSM_HOST_BASE","http://fsm:9000/devices")
+DISPATCH_TIMEOUT_SEC = float(os.getenv("DISPATCH_TIMEOUT_SEC", "10"))  # 디스패치 한 번에 허용하는 전체 시간 (fsm → action I/O로 전달)
 
 class Plan(BaseModel):
     items: Dict[str,PlanItem]
@@ -19,11 +20,24 @@ def dispatch_fn(actuator: str, item: PlanItem):
     # 리퀘스트 보냄 /devies/{actuator}/jobs {"cmd_name": "string", "duration_sec": 0, ...}
     # 룰 파일과 이름 달라서 변경
     item.action_param["cmd_name"] = item.action_param.pop("state")
-    res = requests.post(url=f"{FSM_HOST_BASE}/{actuator}/jobs",json=item.action_param)
+    res = requests.post(url=f"{FSM_HOST_BASE}/{actuator}/jobs",json=item.action_param,
+                        headers={"X-Timeout-Sec": str(DISPATCH_TIMEOUT_SEC)}, timeout=DISPATCH_TIMEOUT_SEC + 1)
     return res
     # print(f"[DISPATCH] {actuator} -> {item.action_name} {item.action_param}")
 
-ps = PlanScheduler(dispatch_fn, debounce_sec=0)
+def batch_dispatch_fn(items: Dict[str, PlanItem]):
+    # 리퀘스트 한 번으로 여러 구동기 전달 /devices/jobs {"jobs": {구동기: {"cmd_name": ..., ...}}}
+    jobs = {}
+    for actuator, item in items.items():
+        param = dict(item.action_param)
+        param["cmd_name"] = param.pop("state")
+        jobs[actuator] = param
+    res = requests.post(url=f"{FSM_HOST_BASE}/jobs", json={"jobs": jobs},
+                        headers={"X-Timeout-Sec": str(DISPATCH_TIMEOUT_SEC)}, timeout=DISPATCH_TIMEOUT_SEC + 1)
+    print(f"[DISPATCH] {list(jobs)} -> {res.status_code} {res.text[:200]}")
+    return res
+
+ps = PlanScheduler(dispatch_fn, debounce_sec=0, batch_dispatch_fn=batch_dispatch_fn)
 
 @app.post("/submit_schedules")
 def submit_schedule(plan: Plan):
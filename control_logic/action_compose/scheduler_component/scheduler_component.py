@@ -29,10 +29,11 @@ def compile_plan(decisions: Dict[str, Any]) -> Plan:
 
 # 플랜을 안전하게 한번씩 보내는 스케쥴러
 class PlanScheduler:
-    def __init__(self, dispatch_fn, debounce_sec=0):
+    def __init__(self, dispatch_fn, debounce_sec=0, batch_dispatch_fn=None):
         self.sched = BackgroundScheduler(timezone="Asia/Seoul", job_defaults={"coalesce": True, "misfire_grace_time": 30, "max_instances": 1})
         self.sched.start()
         self.dispatch_fn = dispatch_fn      # 상태머신에 전달하는 콜백
+        self.batch_dispatch_fn = batch_dispatch_fn  # 있으면 한 플랜의 구동기들을 한 번에 전달 {구동기: PlanItem}
         self.last_sig = {}                  # 구동기별 마지막 시그니처, 디듀프 기준
         self.debounce = {}                  # 구동기별 디바운스 만료시각 구동기별로 마지막 명령이 유효한 만료시각을 저장. 예) "CO2": 2025-09-02 03:00:10 
         self.debounce_sec = debounce_sec    # 모든 구동기에 공통으로 적용할 디바운스 시간(초)
@@ -62,6 +63,7 @@ class PlanScheduler:
             return
         
         scheduled_any = False
+        batch: Dict[str, PlanItem] = {}
         
         for act, item in plan.items.items():
             sig = self._sig(item)
@@ -78,6 +80,9 @@ class PlanScheduler:
             self.last_sig[act] = sig
             if window_sec > 0:
                 self.debounce[act] = now + timedelta(seconds=window_sec)
+            if self.batch_dispatch_fn:
+                batch[act] = item
+                continue
             # 고정 job_id로 교체 등록
             job_id = f"{act}:apply"
             if job_id_new_flag:
@@ -91,7 +96,31 @@ class PlanScheduler:
                 args=[act, item]
             )
             scheduled_any = True
+
+        if batch:
+            self._add_batch_job(batch, run_at, job_id_new_flag)
+            scheduled_any = True
         
         # 전역 디바운스 갱신: 이번 제출에서 하나라도 등록되면 활성화
         if scheduled_any and self.debounce_sec > 0:
-            self.global_until = now + timedelta(seconds=self.debounce_sec)
\ No newline at end of file
+            self.global_until = now + timedelta(seconds=self.debounce_sec)
+
+    def _add_batch_job(self, batch: Dict[str, PlanItem], run_at, job_id_new_flag: bool):
+        """
+        플랜 하나를 잡 하나로 등록
+        아직 실행 전인 같은 job_id가 있으면 구동기별로 합친 뒤(새 항목 우선) 교체
+        """
+        job_id = "plan:apply"
+        if job_id_new_flag:
+            job_id = f"plan:apply:{run_at}"
+        pending = self.sched.get_job(job_id)
+        if pending:
+            batch = {**pending.args[0], **batch}
+        self.sched.add_job(
+            self.batch_dispatch_fn,
+            "date",
+            run_date=run_at,
+            id=job_id,
+            replace_existing=True,
+            args=[batch]
+        )
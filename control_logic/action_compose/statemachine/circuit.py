@@ -0,0 +1,72 @@
+import time
+
+class CircuitOpenError(Exception):
+    """차단기가 열려 있어 action I/O로 요청을 보내지 않고 바로 실패시킬 때"""
+
+
+class CircuitBreaker:
+    """
+    연속 실패가 failure_threshold번 쌓이면 열림(open) → reset_timeout 동안 즉시 실패
+    reset_timeout이 지나면 반열림(half_open)으로 요청 하나만 시험 삼아 통과시키고
+    성공하면 닫힘(closed), 실패하면 다시 열림
+    """
+    def __init__(self, name: str, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0           # 연속 실패 수
+        self.opened_at = 0.0        # time.monotonic()
+        self._probing = False
+        # 메트릭
+        self.trips = 0              # 열린 횟수
+        self.rejected = 0           # 열려 있어서 바로 실패시킨 수
+        self.total_failures = 0
+        self.total_successes = 0
+
+    def allow(self) -> bool:
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+            self._probing = False
+        if self.state == "closed":
+            return True
+        if self.state == "half_open" and not self._probing:
+            self._probing = True    # 복구 확인용 요청 하나만 통과
+            return True
+        self.rejected += 1
+        return False
+
+    def release(self):
+        """allow()로 받은 시험 요청을 실제로 보내지 않았을 때 되돌린다."""
+        self._probing = False
+
+    def check(self):
+        if not self.allow():
+            raise CircuitOpenError(f"circuit open: {self.name}")
+
+    def record_success(self):
+        self.total_successes += 1
+        self.failures = 0
+        self.state = "closed"
+        self._probing = False
+
+    def record_failure(self):
+        self.total_failures += 1
+        self.failures += 1
+        self._probing = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.trips += 1
+                print(f"[circuit] {self.name} 차단기 열림 (연속 실패 {self.failures})")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "trips": self.trips,
+            "rejected": self.rejected,
+            "total_failures": self.total_failures,
+            "total_successes": self.total_successes,
+        }
@@ -0,0 +1,62 @@
+import asyncio, time
+from collections import deque
+
+# FSM 상태 → 이벤트 이름
+EVENT_NAMES = {
+    "sending": "command_sending",
+    "verifying": "command_sent",
+    "working": "working",
+    "completed": "completed",
+    "error": "error",
+    "timeout": "timeout",
+    "preempted": "preempted",
+}
+
+class Subscriber:
+    def __init__(self, devices: set[str] | None, maxsize: int):
+        self.devices = devices              # None이면 전체 장치
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False             # 너무 느려서 끊긴 구독자 (Last-Event-ID로 재접속하면 따라잡는다)
+
+    def wants(self, ev: dict) -> bool:
+        return self.devices is None or ev["device"] in self.devices
+
+
+class EventBus:
+    """
+    장치 상태 전이 이벤트를 링버퍼에 쌓고 구독자들에게 뿌린다.
+    늦게 붙은 구독자는 since(seq)로 버퍼에 남은 이벤트부터 따라잡는다.
+    """
+    def __init__(self, maxlen: int = 1000, queue_size: int = 256):
+        self.buffer: deque[dict] = deque(maxlen=maxlen)
+        self.seq = 0
+        self.queue_size = queue_size
+        self._subscribers: set[Subscriber] = set()
+
+    def publish(self, device: str, event: str, **detail) -> dict:
+        self.seq += 1
+        ev = {"seq": self.seq, "ts": time.time(), "device": device, "event": event, **detail}
+        self.buffer.append(ev)
+        for sub in list(self._subscribers):
+            if not sub.wants(ev):
+                continue
+            try:
+                sub.queue.put_nowait(ev)
+            except asyncio.QueueFull:
+                sub.overflowed = True
+                self._subscribers.discard(sub)
+        return ev
+
+    def since(self, seq: int, devices: set[str] | None = None) -> list[dict]:
+        return [ev for ev in self.buffer if ev["seq"] > seq and (devices is None or ev["device"] in devices)]
+
+    def subscribe(self, devices: set[str] | None = None) -> Subscriber:
+        sub = Subscriber(devices, self.queue_size)
+        self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        self._subscribers.discard(sub)
+
+    def stats(self) -> dict:
+        return {"seq": self.seq, "buffered": len(self.buffer), "subscribers": len(self._subscribers)}
@@ -1,55 +1,274 @@
 # fsm_server.py
-import asyncio, os
-from fastapi import FastAPI, HTTPException
+import asyncio, json, os, time
+import httpx
+from fastapi import FastAPI, HTTPException, Header
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from statemachine import DeviceFSM  # 네가 만든 FSM
+from statemachine import DeviceFSM, GatewayPoller, DeadlineExceeded, JobDropped  # 네가 만든 FSM
+from circuit import CircuitOpenError
+from events import EventBus, EVENT_NAMES
 
 # uvicorn fsm_server:app --reload --port 9000
 
 # 액션 I/O 서버(네 mock_action_io) 주소
 ACTION_IO_HOST = os.getenv("ACTION_IO_HOST","http://actionio:8000")
 
+# 시작 시 FSM을 만들어 두고 백그라운드로 상태를 갱신할 구동기 목록
+DEVICES = [d for d in os.getenv("DEVICES", "FCU_FAN,FCU_PUMP,CO2,FAN,FOG,SKY_WINDOW_LEFT,SKY_WINDOW_RIGHT,SHADING_SCREEN,HEAT_CURTAIN,NUTRIENT_PUMP").split(",") if d]
+STATE_TTL_SEC = float(os.getenv("STATE_TTL_SEC", "15"))          # 이 시간 안에 읽은 상태만 중복 명령 판단에 사용
+STATE_REFRESH_SEC = float(os.getenv("STATE_REFRESH_SEC", "10"))  # 백그라운드 상태 갱신 주기 (0이면 끔)
+ACTION_IO_TIMEOUT_SEC = float(os.getenv("ACTION_IO_TIMEOUT_SEC", "5"))  # action I/O 호출 한 번의 최대 대기
+DEFAULT_DEADLINE_SEC = float(os.getenv("DEFAULT_DEADLINE_SEC", "10"))   # X-Timeout-Sec 헤더가 없을 때 요청 전체 시간
+EVENT_BUFFER_SIZE = int(os.getenv("EVENT_BUFFER_SIZE", "1000"))    # 늦은 구독자가 따라잡을 수 있는 이벤트 수
+# 장치별 작업 대기열 정책 (latest / preempt / fifo). 장치별로 다르게: JOB_POLICY_OVERRIDES="NUTRIENT_PUMP=fifo,FAN=latest"
+JOB_POLICY = os.getenv("JOB_POLICY", "preempt")
+JOB_POLICY_OVERRIDES = dict(kv.split("=", 1) for kv in os.getenv("JOB_POLICY_OVERRIDES", "").split(",") if "=" in kv)
+VERIFY_ON_SEND = os.getenv("VERIFY_ON_SEND", "1") == "1"   # 명령 응답에 직후 상태를 같이 받아 opid 확인 (action I/O FC23)
+
 app = FastAPI(title="FSM Controller")
 
-# 장치별 FSM 인스턴스 & 락
+# 장치별 FSM 인스턴스 (장치마다 자기 작업 대기열을 가지고 있어 따로 락을 잡지 않는다)
 _devices: dict[str, DeviceFSM] = {}
-_locks: dict[str, asyncio.Lock] = {}
+
+# 모든 FSM이 공유하는 HTTP 클라이언트 & 게이트웨이(호스트)별 폴러
+_client: httpx.AsyncClient | None = None
+_pollers: dict[str, GatewayPoller] = {}
+
+# 상태 전이 이벤트 스트림
+_events = EventBus(maxlen=EVENT_BUFFER_SIZE)
+
+def _publish_transition(fsm: DeviceFSM):
+    _events.publish(
+        fsm.actuator_name,
+        EVENT_NAMES.get(fsm.state, fsm.state),
+        fsm_state=fsm.state,
+        opid=fsm.want_opid,
+        state_code=fsm.last_state_code,
+        open_pct=fsm.last_open_pct,
+        suppressed=fsm.suppress_reason,
+    )
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient()
+    return _client
+
+def get_poller(host: str) -> GatewayPoller:
+    if host not in _pollers:
+        _pollers[host] = GatewayPoller(get_client(), host, min_interval=0.5, max_interval=5.0)
+    return _pollers[host]
 
 def get_fsm(name: str) -> DeviceFSM:
     if name not in _devices:
-        _devices[name] = DeviceFSM(host=ACTION_IO_HOST, actuator_name=name, verify_interval=1.0)
-        _locks[name] = asyncio.Lock()
+        _devices[name] = DeviceFSM(host=ACTION_IO_HOST, actuator_name=name, verify_interval=1.0, timeout=ACTION_IO_TIMEOUT_SEC,
+                                   client=get_client(), poller=get_poller(ACTION_IO_HOST),
+                                   state_ttl=STATE_TTL_SEC, on_transition=_publish_transition,
+                                   policy=JOB_POLICY_OVERRIDES.get(name, JOB_POLICY),
+                                   verify_on_send=VERIFY_ON_SEND)
     return _devices[name]
 
+async def _refresh_loop():
+    # 게이트웨이별로 알려진 장치 상태를 주기적으로 읽어 캐시를 신선하게 유지
+    while True:
+        await asyncio.sleep(STATE_REFRESH_SEC)
+        for host, poller in list(_pollers.items()):
+            names = [n for n, f in _devices.items() if f.host == host.rstrip("/")]
+            try:
+                await poller.refresh(names)
+            except Exception as e:
+                print(f"상태 갱신 실패 {host}: {e!r}")
+
+_refresh_task: asyncio.Task | None = None
+
+@app.on_event("startup")
+async def startup_event():
+    global _refresh_task
+    for name in DEVICES:
+        get_fsm(name)
+    if STATE_REFRESH_SEC > 0:
+        _refresh_task = asyncio.create_task(_refresh_loop())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if _refresh_task is not None:
+        _refresh_task.cancel()
+    for fsm in _devices.values():
+        await fsm.close()
+    if _client is not None:
+        await _client.aclose()
+
 # ---- 스키마 ----
 class StartJobReq(BaseModel):
     cmd_name: str           # "OPEN" 같은 문자열
     duration_sec: int | None = 0
     ec: float | None = None
-    ph: float | None = None    
+    ph: float | None = None
 
 class StartJobResp(BaseModel):
     opid: int
     state: str
 
+class BulkJobReq(BaseModel):
+    jobs: dict[str, StartJobReq]   # 장치명 → 작업
+
+class BulkJobResp(BaseModel):
+    results: dict[str, StartJobResp]
+    errors: dict[str, str]
+
 class FSMStateResp(BaseModel):
     state: str
     want_opid: int | None
     deadline_ts: float
     last_state_code: int | None
     last_opid: int | None
+    last_open_pct: int | None = None
+    confirmed_ts: float | None = None
+    cache: dict | None = None
+    cache_age_sec: float | None = None
+    queue: dict | None = None
+
+def _deadline(x_timeout_sec: float | None) -> float:
+    budget = DEFAULT_DEADLINE_SEC if x_timeout_sec is None else x_timeout_sec
+    return time.monotonic() + budget
+
+def _http_error(e: Exception) -> HTTPException:
+    if isinstance(e, JobDropped):
+        return HTTPException(409, str(e))
+    if isinstance(e, CircuitOpenError):
+        return HTTPException(503, str(e))
+    if isinstance(e, (DeadlineExceeded, httpx.TimeoutException)):
+        return HTTPException(504, str(e) or "deadline exceeded")
+    if isinstance(e, httpx.HTTPStatusError):
+        return HTTPException(502, f"action I/O {e.response.status_code}: {e.response.text[:200]}")
+    if isinstance(e, httpx.TransportError):
+        return HTTPException(502, f"action I/O unreachable: {e!r}")
+    return HTTPException(500, repr(e))
+
+async def _run_job(name: str, req: StartJobReq, deadline: float) -> StartJobResp:
+    fsm = get_fsm(name)
+    if deadline <= time.monotonic():
+        raise DeadlineExceeded(f"{name}: deadline exceeded before send")
+    # 장치 대기열에 넣고 전송될 때까지 기다림 (대기도 남은 시간 안에서만)
+    opid = await fsm.start_job(
+        payload = req.model_dump(exclude_none=True),
+        deadline = deadline,
+    )
+    return StartJobResp(opid=opid, state=fsm.state)
 
 # ---- 엔드포인트 ----
+@app.post("/devices/jobs")
+async def start_jobs(req: BulkJobReq, x_timeout_sec: float | None = Header(default=None)) -> BulkJobResp:
+    # 여러 구동기 명령을 한 번에 받아 장치별 대기열에 넣고 동시에 전송
+    print(f"일괄 요청이 들어왔습니다. devices: {list(req.jobs)}")
+    names = list(req.jobs)
+    deadline = _deadline(x_timeout_sec)
+    outs = await asyncio.gather(*(_run_job(n, req.jobs[n], deadline) for n in names), return_exceptions=True)
+    results, errors = {}, {}
+    for name, out in zip(names, outs):
+        if isinstance(out, Exception):
+            print(f"{name} 일괄 요청 실패: {out!r}")
+            errors[name] = _http_error(out).detail
+        else:
+            results[name] = out
+    return BulkJobResp(results=results, errors=errors)
+
 @app.post("/devices/{name}/jobs")
-async def start_job(name: str, req: StartJobReq):
-    fsm = get_fsm(name)
+async def start_job(name: str, req: StartJobReq, x_timeout_sec: float | None = Header(default=None)) -> int:
+    # 응답은 예전처럼 opid(int) 하나 (FSM 상태는 GET /devices/{name}/state)
     print(f"{name} 요청이 들어왔습니다. req: {req}")
-    async with _locks[name]:
-        payload = req.model_dump(exclude_none=True)
-        opid = await fsm.start_job(
-            payload = payload
-        )
-        return opid
+    try:
+        return (await _run_job(name, req, _deadline(x_timeout_sec))).opid
+    except Exception as e:
+        print(f"{name} 요청 실패: {e!r}")
+        raise _http_error(e)
+
+@app.get("/devices/{name}/state")
+def get_state(name: str) -> FSMStateResp:
+    if name not in _devices:
+        raise HTTPException(404, f"unknown device: {name}")
+    fsm = _devices[name]
+    return FSMStateResp(
+        state=fsm.state,
+        want_opid=fsm.want_opid,
+        deadline_ts=fsm.deadline_ts,
+        last_state_code=fsm.last_state_code,
+        last_opid=fsm.last_opid,
+        last_open_pct=fsm.last_open_pct,
+        confirmed_ts=fsm.confirmed_ts,
+        cache=fsm.cache,
+        cache_age_sec=fsm.cache_age(),
+        queue=fsm.queue_stats(),
+    )
+
+@app.post("/devices/{name}/state")
+async def push_state(name: str, st: dict):
+    # action I/O가 읽은 장치 상태를 밀어넣는 경로 {"opid": ..., "state": ..., ...}
+    get_fsm(name).update_cache(st)
+    return {"ok": True}
+
+def _parse_devices(devices: str | None) -> set[str] | None:
+    names = {d for d in (devices or "").split(",") if d}
+    return names or None
+
+def _sse(ev: dict) -> str:
+    return f"id: {ev['seq']}\nevent: {ev['event']}\ndata: {json.dumps(ev, ensure_ascii=False)}\n\n"
+
+@app.get("/events")
+async def stream_events(devices: str | None = None, since: int | None = None,
+                        last_event_id: str | None = Header(default=None)):
+    """
+    장치 상태 전이를 SSE로 흘려준다. devices=FAN,CO2 로 필터링
+    since 또는 Last-Event-ID 이후 버퍼에 남은 이벤트부터 먼저 보낸다.
+    """
+    names = _parse_devices(devices)
+    if since is None and last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+
+    async def gen():
+        sub = _events.subscribe(names)
+        last = since if since is not None else _events.seq
+        try:
+            for ev in _events.since(last, names):
+                last = ev["seq"]
+                yield _sse(ev)
+            while not sub.overflowed:
+                try:
+                    ev = await asyncio.wait_for(sub.queue.get(), 15)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if ev["seq"] <= last:
+                    continue
+                last = ev["seq"]
+                yield _sse(ev)
+        finally:
+            _events.unsubscribe(sub)
+
+    return StreamingResponse(gen(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/events/recent")
+def recent_events(devices: str | None = None, since: int = 0):
+    return _events.since(since, _parse_devices(devices))
+
+@app.get("/metrics")
+def metrics():
+    return {
+        "devices": {
+            name: {
+                "state": fsm.state,
+                "sent": fsm.sent_count,
+                "suppressed": dict(fsm.suppressed),
+                "cache_age_sec": fsm.cache_age(),
+                "breaker": fsm.breaker.stats(),
+                "queue": fsm.queue_stats(),
+            }
+            for name, fsm in _devices.items()
+        },
+        "pollers": {host: {"polls": p.polls, "breaker": p.breaker.stats()} for host, p in _pollers.items()},
+        "events": _events.stats(),
+    }
 
 @app.get("/health")
 def health():
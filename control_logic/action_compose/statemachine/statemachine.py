@@ -1,8 +1,35 @@
 import asyncio, time
-from typing import Optional, Protocol, Any
-from transitions import Machine
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Any, Callable
+from transitions.extensions.asyncio import AsyncMachine
 from ksconstants import STATCODE, CMDCODE
-import requests
+from circuit import CircuitBreaker, CircuitOpenError
+import httpx
+
+# 남은 처리 시간(초)을 다음 홉으로 넘기는 헤더 (scheduler → fsm → action I/O)
+DEADLINE_HEADER = "X-Timeout-Sec"
+
+class DeadlineExceeded(Exception):
+    """요청의 남은 시간이 다 되어 action I/O로 보내지 않고 포기할 때"""
+
+class JobDropped(Exception):
+    """대기열에 있던 작업이 더 새 작업에 밀려 버스에 나가기 전에 버려졌을 때"""
+
+# 장치별 작업 대기열 정책
+#   latest  : 대기중인 작업은 가장 최근 것 하나만 남기고, 진행중인 작업의 opid가 확인되면 보낸다
+#   preempt : latest + 진행중인 작업이 시간제 명령(TIMED_OPEN 등, duration_sec > 0)이거나
+#             새 작업이 반대 방향(열림 ↔ 닫힘)이면 opid 확인을 기다리지 않고 끊고 바로 보낸다
+#   fifo    : 들어온 순서대로 하나씩, 앞 작업의 opid가 확인된 뒤에 보낸다
+# 어느 정책이든 동작 완료(settle)까지의 확인은 백그라운드에서 계속되고 대기열을 잡지 않는다
+JOB_POLICIES = ("latest", "preempt", "fifo")
+
+@dataclass
+class Job:
+    payload: dict
+    deadline: float | None                  # time.monotonic() 기준, 이 시각이 지나면 보내지 않고 버린다
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
 
 # “워킹으로 간주”할 코드 집합(필요시 여기만 바꾸면 됨)
 WORKING_CODES = frozenset({
@@ -12,6 +39,28 @@ WORKING_CODES = frozenset({
 
 OPEN_CODES = frozenset({CMDCODE.OPEN,CMDCODE.TIMED_OPEN})
 CLOSE_CODES = frozenset({CMDCODE.CLOSE,CMDCODE.TIMED_CLOSE})
+TIMED_CODES = frozenset({CMDCODE.TIMED_ON, CMDCODE.TIMED_OPEN, CMDCODE.TIMED_CLOSE})
+
+# 이 명령은 장치가 이미 해당 상태(남은 시간 0)면 다시 보낼 필요가 없다. 시간제 명령은 제외
+STEADY_STATES = {
+    CMDCODE.OFF: STATCODE.READY,
+    CMDCODE.ON: STATCODE.WORKING,
+    CMDCODE.OPEN: STATCODE.OPENING,
+    CMDCODE.CLOSE: STATCODE.CLOSING,
+}
+
+# FSM 상태: 명령 전송 → opid 확인(폴링) → 완료 / 에러 / 타임아웃
+FSM_STATES = ["idle", "sending", "verifying", "working", "completed", "error", "timeout", "preempted"]
+FSM_TRANSITIONS = [
+    {"trigger": "dispatch", "source": "*",                      "dest": "sending"},
+    {"trigger": "sent",     "source": "sending",                "dest": "verifying"},
+    {"trigger": "suppress", "source": "sending",                "dest": "completed"},
+    {"trigger": "progress", "source": "verifying",              "dest": "working"},
+    {"trigger": "complete", "source": ["verifying", "working"], "dest": "completed"},
+    {"trigger": "fail",     "source": "*",                      "dest": "error"},
+    {"trigger": "expire",   "source": ["verifying", "working"], "dest": "timeout"},
+    {"trigger": "preempt",  "source": ["verifying", "working"], "dest": "preempted"},
+]
 
 def is_working_code(code: STATCODE) -> bool:
     try:
@@ -31,56 +80,548 @@ def is_close_code(code: STATCODE) -> bool:
     except Exception:
         return False
 
+def is_timed_job(payload: dict) -> bool:
+    cmd = CMDCODE.__members__.get(payload.get("cmd_name", ""))
+    return cmd in TIMED_CODES or int(payload.get("duration_sec") or 0) > 0
+
+def reverses(current: dict, new: dict) -> bool:
+    # 열림 계열 도중 닫힘 계열이 오거나 그 반대 → 진행중인 작업은 의미가 없어짐
+    a = CMDCODE.__members__.get(current.get("cmd_name", ""))
+    b = CMDCODE.__members__.get(new.get("cmd_name", ""))
+    return (is_open_code(a) and is_close_code(b)) or (is_close_code(a) and is_open_code(b))
+
+def state_code(st: dict) -> int | None:
+    # action I/O는 "state", mock_action_io는 "state_code"로 내려준다
+    code = st.get("state", st.get("state_code"))
+    return int(code) if code is not None else None
+
+def state_opid(st: dict) -> int | None:
+    opid = st.get("opid")
+    return int(opid) if opid is not None else None
+
+def same_state(a: dict | None, b: dict | None) -> bool:
+    # action I/O 상태표가 붙여주는 age_sec는 읽을 때마다 달라지므로 비교에서 뺀다
+    if a is None or b is None:
+        return a is b
+    return {k: v for k, v in a.items() if k != "age_sec"} == {k: v for k, v in b.items() if k != "age_sec"}
+
+
+class GatewayPoller:
+    """
+    같은 게이트웨이(action I/O 호스트) 뒤에 있는 장치들의 get_state 폴링을 하나의 루프로 묶는다.
+    여러 FSM이 동시에 확인을 기다려도 한 주기에 장치당 한 번만 읽고,
+    상태 변화가 없으면 주기를 min_interval → max_interval 까지 늘린다.
+    """
+    def __init__(self, client: httpx.AsyncClient, host: str,
+                 min_interval: float = 0.5, max_interval: float = 5.0, backoff: float = 1.5, timeout: float = 3.0,
+                 breaker: CircuitBreaker | None = None):
+        self.client = client
+        self.host = host.rstrip("/")
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker(f"gateway:{self.host}")  # 게이트웨이(action I/O) 단위 차단기
+        self.polls = 0                                  # 실제 get_state 호출 횟수
+        self.bulk = True                                # GET /actuators/state(묶음 읽기) 사용 여부, 없는 서버면 끔
+        self.last_states: dict[str, dict] = {}          # 장치별 마지막으로 읽은 상태
+        self._listeners: dict[str, Callable[[dict], None]] = {}
+        self._interval = min_interval
+        self._waiters: dict[str, list[tuple[Callable[[dict], bool], asyncio.Future]]] = {}
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def subscribe(self, name: str, callback: Callable[[dict], None]):
+        """name 장치 상태를 읽을 때마다 callback(state) 호출 (FSM 상태 캐시 갱신용)"""
+        self._listeners[name] = callback
+
+    async def fetch(self, name: str) -> dict:
+        self.breaker.check()
+        try:
+            r = await self.client.get(f"{self.host}/actuators/{name}/get_state", timeout=self.timeout,
+                                      headers={DEADLINE_HEADER: f"{self.timeout:.3f}"})
+        except httpx.TransportError:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+        self.breaker.record_success()
+        r.raise_for_status()
+        self.polls += 1
+        st = r.json()  # {"opid": ..., "state": ...}
+        if name in self._listeners:
+            self._listeners[name](st)
+        return st
+
+    async def fetch_many(self, names: list[str]) -> list[dict | Exception]:
+        """
+        여러 장치 상태를 GET /actuators/state 한 번으로 읽는다 (action I/O가 slave별로 묶어 읽음).
+        묶음 엔드포인트가 없는 action I/O면 장치별 get_state로 돌아간다.
+        """
+        if not self.bulk or len(names) < 2:
+            return await asyncio.gather(*(self.fetch(n) for n in names), return_exceptions=True)
+        try:
+            self.breaker.check()
+            try:
+                r = await self.client.get(f"{self.host}/actuators/state", params={"names": ",".join(names)},
+                                          timeout=self.timeout, headers={DEADLINE_HEADER: f"{self.timeout:.3f}"})
+            except httpx.TransportError:
+                self.breaker.record_failure()
+                raise
+            except BaseException:
+                self.breaker.release()
+                raise
+            self.breaker.record_success()
+            # 없는 구동기명은 200 본문의 errors로 오므로 404/405는 라우트 자체가 없다는 뜻
+            if r.status_code in (404, 405):
+                print(f"{self.host} 묶음 상태 조회 미지원 → 장치별 get_state 사용")
+                self.bulk = False
+                return await self.fetch_many(names)
+            r.raise_for_status()
+        except Exception as e:
+            return [e] * len(names)
+        self.polls += 1
+        body = r.json()   # {"states": {name: state}, "errors": {name: msg}}
+        states, errors = body.get("states", {}), body.get("errors", {})
+        results: list[dict | Exception] = []
+        for name in names:
+            if name in states:
+                st = states[name]
+                if name in self._listeners:
+                    self._listeners[name](st)
+                results.append(st)
+            else:
+                results.append(IOError(f"{name}: {errors.get(name, 'missing in bulk state')}"))
+        return results
+
+    async def refresh(self, names: list[str]):
+        """확인 대기와 별개로 장치 상태를 한 번씩 읽어 캐시를 갱신 (백그라운드 주기 갱신용)"""
+        results = await self.fetch_many(names)
+        for name, st in zip(names, results):
+            if isinstance(st, Exception):
+                print(f"get_state 갱신 실패 {name}: {st!r}")
+            else:
+                self.last_states[name] = st
+
+    async def wait_for(self, name: str, predicate: Callable[[dict], bool], timeout: float) -> dict:
+        """predicate(state)가 참이 되는 상태를 돌려준다. timeout 초과 시 asyncio.TimeoutError."""
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(name, []).append((predicate, fut))
+        self._interval = self.min_interval     # 새 대기자가 생기면 빠른 주기로 복귀
+        self._wake.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        try:
+            return await asyncio.wait_for(fut, timeout)
+        finally:
+            waiters = self._waiters.get(name, [])
+            waiters[:] = [w for w in waiters if w[1] is not fut]
+            if not waiters:
+                self._waiters.pop(name, None)
+
+    async def _run(self):
+        while self._waiters:
+            self._wake.clear()
+            names = list(self._waiters)
+            results = await self.fetch_many(names)
+            changed = False
+            for name, st in zip(names, results):
+                if isinstance(st, Exception):
+                    print(f"get_state 폴링 실패 {name}: {st!r}")
+                    continue
+                if not same_state(st, self.last_states.get(name)):
+                    changed = True
+                self.last_states[name] = st
+                for predicate, fut in list(self._waiters.get(name, [])):
+                    if not fut.done() and predicate(st):
+                        fut.set_result(st)
+            if changed:
+                self._interval = self.min_interval
+            else:
+                self._interval = min(self._interval * self.backoff, self.max_interval)
+            try:
+                await asyncio.wait_for(self._wake.wait(), self._interval)
+            except asyncio.TimeoutError:
+                pass
+
+
 class DeviceFSM:
 
-    def __init__(self, actuator_name: str, host: str, verify_interval: float = 1.0, timeout = 3000):
+    def __init__(self, actuator_name: str, host: str, verify_interval: float = 1.0, timeout: float = 5.0,
+                 client: httpx.AsyncClient | None = None, poller: GatewayPoller | None = None,
+                 ack_timeout: float = 10.0, settle_timeout: float = 180.0, state_ttl: float = 15.0,
+                 on_transition: Callable[["DeviceFSM"], None] | None = None, policy: str = "preempt",
+                 verify_on_send: bool = True):
+        if policy not in JOB_POLICIES:
+            raise ValueError(f"unknown job policy: {policy} (one of {JOB_POLICIES})")
         self.actuator_name = actuator_name
         self.host = host.rstrip("/")
         self.base_url = f"{self.host}/actuators/{self.actuator_name}"
         self.timeout = timeout # 이 시간동안 안되면 실패로 간주
+        self.client = client or httpx.AsyncClient()
+        self.poller = poller or GatewayPoller(self.client, self.host, min_interval=verify_interval)
+        self.breaker = CircuitBreaker(f"device:{actuator_name}")  # 장치 단위 차단기 (게이트웨이 차단기는 poller.breaker)
+        self.ack_timeout = ack_timeout          # 명령 후 opid가 돌아올 때까지 기다리는 시간
+        self.settle_timeout = settle_timeout    # opid 확인 후 동작(열림/닫힘/급액)이 끝날 때까지 추가로 기다리는 시간
         self.last_state_code = 0
         self.last_open_pct = None
+        self.last_opid = None
+        self.want_opid = None
+        self.deadline_ts = 0.0
+        self.confirmed: dict | None = None      # 마지막으로 확인된 장치 상태
+        self.confirmed_ts: float | None = None
+        # 장치 상태 캐시: 폴링/푸시로 갱신되고 state_ttl 동안만 중복 명령 판단에 쓴다
+        self.state_ttl = state_ttl
+        self.cache: dict | None = None
+        self.cache_ts = 0.0                     # time.monotonic() 기준
+        self._sent_mono = 0.0                   # 마지막 명령 전송 시각(time.monotonic())
+        self.sent_count = 0
+        self.suppressed = Counter()             # 사유별 생략한 명령 수
+        self.suppress_reason: str | None = None # 이번 작업이 생략된 사유
+        self.on_transition = on_transition      # 상태 전이마다 호출 (이벤트 스트림 발행용)
+        self.poller.subscribe(self.actuator_name, self.update_cache)
+        self._verify_task: asyncio.Task | None = None
+        self._acked: asyncio.Future | None = None   # 진행중인 작업의 opid 확인(또는 실패)이 끝나면 완료 → 워커가 다음 작업으로
+        self._seq = 0                               # 보낸 작업 번호. 밀려난 작업의 확인 결과가 새 작업의 FSM 상태를 건드리지 않게
+        self._current: dict | None = None           # 진행중인 작업의 payload (preempt 판단용)
+        self._settling: set[asyncio.Task] = set()   # 다음 작업이 나간 뒤에도 동작 완료를 기다리는 이전 확인 작업
+        self.verify_on_send = verify_on_send    # send_command?verify=true: 명령 응답에 직후 상태를 같이 받는다
+        self._ack: dict | None = None           # 명령 응답에 딸려 온 장치 상태
+        # 작업 대기열: 장치당 워커 하나가 꺼내서 보내고, 확인이 끝날 때까지 다음 작업을 잡아둔다
+        self.policy = policy
+        self._jobs: deque[Job] = deque()
+        self._job_event = asyncio.Event()
+        self._worker_task: asyncio.Task | None = None
+        self.job_count = 0                      # 실제로 보낸(생략 포함) 작업 수
+        self.dropped = Counter()                # 사유별 버린 작업 수 (superseded / expired / cancelled)
+        self.preempted_count = 0
+        self.last_wait_sec = 0.0                # 마지막 작업이 대기열에서 기다린 시간
+        self.max_wait_sec = 0.0
+        self.total_wait_sec = 0.0
+        self.machine = AsyncMachine(model=self, states=FSM_STATES, transitions=FSM_TRANSITIONS,
+                                    initial="idle", auto_transitions=False,
+                                    after_state_change="_notify_transition")
 
     def _url(self, path: str) -> str:
         return f"{self.base_url}{path}"
-    
-    def _send_command(self, payload: dict[str, Any]) -> int:
+
+    def _notify_transition(self):
+        if self.on_transition is not None:
+            self.on_transition(self)
+
+    # --- 상태 캐시 ---
+    def update_cache(self, st: dict):
+        # 명령 직후에는 새 opid가 반영된 상태만 받는다 (전송 전에 출발한 읽기 결과 무시)
+        if (time.monotonic() - self._sent_mono < self.ack_timeout
+                and self.want_opid is not None and state_opid(st) != self.want_opid):
+            return
+        self.cache = st
+        # action I/O 상태표에서 온 값이면 실제로 읽은 시각 기준으로 나이를 잡는다
+        self.cache_ts = time.monotonic() - float(st.get("age_sec") or 0)
+
+    def cache_age(self) -> float | None:
+        if self.cache is None:
+            return None
+        return time.monotonic() - self.cache_ts
+
+    def fresh_state(self) -> dict | None:
+        age = self.cache_age()
+        if age is None or age > self.state_ttl:
+            return None
+        return self.cache
+
+    def _suppress_reason(self, payload: dict[str, Any]) -> str | None:
+        """캐시가 신선할 때만, 보내도 장치 상태가 바뀌지 않는 명령이면 사유를 돌려준다."""
+        st = self.fresh_state()
+        cmd = CMDCODE.__members__.get(payload.get("cmd_name", ""))
+        if st is None or cmd is None:
+            return None
+        code = state_code(st)
+        remain = int(st.get("remain_sec") or 0)
+        open_pct = st.get("open_pct")
+        if cmd in STEADY_STATES and code == STEADY_STATES[cmd] and remain == 0:
+            return "same_state"
+        if code == STATCODE.READY and is_open_code(cmd) and open_pct == 100:
+            return "already_open"
+        if code == STATCODE.READY and is_close_code(cmd) and open_pct == 0:
+            return "already_closed"
+        return None
+
+    def _acquire_circuits(self):
+        gateway = self.poller.breaker
+        if not gateway.allow():
+            raise CircuitOpenError(f"circuit open: {gateway.name}")
+        if not self.breaker.allow():
+            gateway.release()
+            raise CircuitOpenError(f"circuit open: {self.breaker.name}")
+
+    async def _send_command(self, payload: dict[str, Any], deadline: float | None = None) -> int:
+        """deadline은 time.monotonic() 기준 절대시각. 남은 시간만큼만 action I/O를 기다린다."""
         print(f"actionio에 요청을 보낼준비 {self.actuator_name} cmd_name : {payload}")
-        
-        # if CMDCODE[payload["cmd_name"]] == STATCODE(self.last_state_code):
-        #     print(f"요청값과 현재 상태가 같아 actionio에 요청을 보내지 않습니다. {self.actuator_name} last_state_code : {self.last_state_code} cmd_name : {payload['cmd_name']}")
-        #     return -1
-        # elif is_open_code(CMDCODE[payload["cmd_name"]]) and self.last_open_pct == 100:
-        #     print(f"{self.actuator_name}이 다 열려있어서 actionio에 요청을 보내지 않습니다.  last_state_code : {self.last_state_code}")
-        #     return -1
-        # elif is_close_code(CMDCODE[payload["cmd_name"]]) and self.last_open_pct == 0:
-        #     print(f"{self.actuator_name}이 다 닫혀있어서 actionio에 요청을 보내지 않습니다.  last_state_code : {self.last_state_code}")
-        #     return -1
-        
-        r = requests.post(
-            self._url("/send_command"),
-            json=payload,
-            timeout=self.timeout,
-        )
-        print(f"actionio에 요청을 보낸 결과 {self.actuator_name} {r.json()}")
-        r.raise_for_status()
-        
-        return int(r.json()["opid"])
-    
-    def _read_state(self):
-        r = requests.get(self._url("/get_state"), timeout=self.timeout)
+
+        reason = self._suppress_reason(payload)
+        if reason:
+            self.suppressed[reason] += 1
+            self.suppress_reason = reason
+            print(f"{self.actuator_name} 요청을 보내지 않습니다({reason}). 캐시 상태 : {self.cache} cmd_name : {payload['cmd_name']}")
+            return -1
+
+        remaining = self.timeout if deadline is None else min(self.timeout, deadline - time.monotonic())
+        if remaining <= 0:
+            raise DeadlineExceeded(f"{self.actuator_name}: deadline exceeded before send")
+        self._acquire_circuits()
+        self._ack = None
+        try:
+            r = await self.client.post(
+                self._url("/send_command"),
+                json=payload,
+                params={"verify": "true"} if self.verify_on_send else None,
+                timeout=remaining,
+                headers={DEADLINE_HEADER: f"{remaining:.3f}"},
+            )
+        except httpx.TransportError:
+            # 연결 실패/타임아웃은 장치와 게이트웨이 모두의 실패
+            self.breaker.record_failure()
+            self.poller.breaker.record_failure()
+            raise
+        except BaseException:
+            self.breaker.release()
+            self.poller.breaker.release()
+            raise
+        self.poller.breaker.record_success()
+        if r.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        print(f"actionio에 요청을 보낸 결과 {self.actuator_name} {r.status_code} {r.text}")
         r.raise_for_status()
-        js = r.json()
-        return js  # {"opid": ..., "state": ...}
-    
+        self.sent_count += 1
+        self.cache_ts = 0.0     # 명령 후 상태가 바뀌므로 다음 읽기 전까지 캐시를 믿지 않는다
+        self._sent_mono = time.monotonic()
+        body = r.json()
+        self.want_opid = int(body["opid"])
+        # 명령과 같은 트랜잭션(FC23)에서 읽은 상태가 오면 캐시에 넣고 opid 확인에 바로 쓴다
+        self._ack = body.get("state")
+        if self._ack is not None:
+            self.update_cache(self._ack)
+
+        return self.want_opid
+
+    async def _read_state(self):
+        return await self.poller.fetch(self.actuator_name)  # {"opid": ..., "state": ...}
+
+    def _remember(self, st: dict):
+        self.last_state_code = state_code(st)
+        self.last_opid = state_opid(st)
+        self.last_open_pct = st.get("open_pct", self.last_open_pct)
+        self.confirmed = st
+        self.confirmed_ts = time.time()
+
+    def _superseded(self, seq: int) -> bool:
+        return seq != self._seq
+
+    async def _verify(self, opid: int, duration_sec: int, seq: int, acked: asyncio.Future):
+        """
+        opid가 장치에 반영되고 동작이 끝날 때까지 get_state를 폴링해 확인한다.
+        opid가 확인되면 acked를 완료해 대기열을 풀어주고, 동작 완료(settle) 확인은 이어서 백그라운드로.
+        그 사이 다음 작업이 나가면(seq 변경) 이 작업의 결과로는 FSM 상태를 바꾸지 않는다.
+        """
+        name = self.actuator_name
+        try:
+            self.deadline_ts = time.time() + self.ack_timeout
+            ack, self._ack = self._ack, None
+            if ack is not None and state_opid(ack) == opid:
+                st = ack    # 명령 응답에서 이미 opid 반영을 확인함 (get_state 한 번 생략)
+            else:
+                st = await self.poller.wait_for(name, lambda st: state_opid(st) == opid, self.ack_timeout)
+            self._remember(st)
+            if self.last_state_code == STATCODE.ERROR:
+                print(f"{name} opid {opid} 장치 에러 상태")
+                await self.fail()
+                return
+            if is_working_code(self.last_state_code):
+                await self.progress()
+                if not acked.done():
+                    acked.set_result(True)
+                settle = self.settle_timeout + (duration_sec or 0)
+                self.deadline_ts = time.time() + settle
+                st = await self.poller.wait_for(
+                    name,
+                    lambda st: state_opid(st) != opid or not is_working_code(state_code(st)),
+                    settle,
+                )
+                if self._superseded(seq):
+                    print(f"{name} opid {opid} 동작 중 다음 작업이 나감 (확인 종료)")
+                    return
+                self._remember(st)
+                if self.last_state_code == STATCODE.ERROR:
+                    print(f"{name} opid {opid} 동작 중 장치 에러")
+                    await self.fail()
+                    return
+            print(f"{name} opid {opid} 확인 완료 state {self.last_state_code}")
+            await self.complete()
+        except asyncio.TimeoutError:
+            if self._superseded(seq):
+                return
+            print(f"{name} opid {opid} 확인 시간 초과 (last_state_code {self.last_state_code}, last_opid {self.last_opid})")
+            await self.expire()
+        except asyncio.CancelledError as e:
+            # 새 작업에 밀려 끊긴 경우 워커가 다음 작업을 보내기 전에 상태를 남긴다
+            if (e.args and e.args[0] == "preempt" and not self._superseded(seq)
+                    and self.state in ("verifying", "working")):
+                await self.preempt()
+            raise
+        except Exception as e:
+            if self._superseded(seq):
+                return
+            print(f"{name} opid {opid} 확인 중 오류: {e!r}")
+            await self.fail()
+        finally:
+            if not acked.done():
+                acked.set_result(False)
+
+    async def wait_confirmed(self) -> str:
+        """진행중인 확인 작업이 끝날 때까지 기다리고 최종 FSM 상태를 돌려준다."""
+        if self._verify_task is not None:
+            await asyncio.wait({self._verify_task})   # 새 작업에 밀려 취소된 경우도 그냥 끝난 것으로 본다
+        return self.state
+
+    # --- 작업 대기열 ---
+    def queue_depth(self) -> int:
+        return len(self._jobs)
+
+    def in_progress(self) -> bool:
+        return self._verify_task is not None and not self._verify_task.done()
+
+    def queue_stats(self) -> dict:
+        return {
+            "policy": self.policy,
+            "depth": len(self._jobs),
+            "in_progress": self.in_progress(),
+            "jobs": self.job_count,
+            "dropped": dict(self.dropped),
+            "preempted": self.preempted_count,
+            "last_wait_sec": round(self.last_wait_sec, 3),
+            "max_wait_sec": round(self.max_wait_sec, 3),
+            "avg_wait_sec": round(self.total_wait_sec / self.job_count, 3) if self.job_count else None,
+        }
+
+    def _drop(self, job: Job, reason: str):
+        self.dropped[reason] += 1
+        if job.future.done():
+            return
+        msg = f"{self.actuator_name}: job {reason} ({job.payload.get('cmd_name')})"
+        job.future.set_exception(DeadlineExceeded(msg) if reason == "expired" else JobDropped(msg))
+
+    def _preempt_current(self, payload: dict):
+        # 진행중인 작업이 시간제이거나 새 작업이 반대 방향일 때만 끊는다. 장치에는 새 명령이 덮어쓰므로 따로 멈춤 명령은 보내지 않는다
+        task = self._verify_task
+        if task is None or task.done() or task.cancelling():
+            return
+        current = self._current or {}
+        if not (is_timed_job(current) or reverses(current, payload)):
+            return
+        self.preempted_count += 1
+        print(f"{self.actuator_name} opid {self.want_opid} 작업을 새 작업으로 중단")
+        task.cancel("preempt")
+
+    async def _worker(self):
+        while True:
+            # 진행중인 작업의 opid가 확인될 때까지 다음 작업은 버스에 내보내지 않는다 (preempt는 submit에서 끊음)
+            if self._acked is not None and not self._acked.done():
+                await asyncio.wait({self._acked, self._verify_task}, return_when=asyncio.FIRST_COMPLETED)
+                continue
+            if not self._jobs:
+                self._job_event.clear()
+                await self._job_event.wait()
+                continue
+            job = self._jobs.popleft()
+            if job.future.done():
+                continue
+            now = time.monotonic()
+            if job.deadline is not None and now >= job.deadline:
+                self._drop(job, "expired")
+                continue
+            wait = now - job.enqueued_at
+            self.job_count += 1
+            self.last_wait_sec = wait
+            self.total_wait_sec += wait
+            self.max_wait_sec = max(self.max_wait_sec, wait)
+            try:
+                opid = await self._execute(job.payload, job.deadline)
+            except Exception as e:
+                if not job.future.done():
+                    job.future.set_exception(e)
+            else:
+                if not job.future.done():
+                    job.future.set_result(opid)
+
+    def _ensure_worker(self):
+        if self._worker_task is None or self._worker_task.done():
+            self._worker_task = asyncio.create_task(self._worker())
+
+    async def close(self):
+        if self._worker_task is not None:
+            self._worker_task.cancel()
+        while self._jobs:
+            self._drop(self._jobs.popleft(), "cancelled")
+
     # --- 외부 진입점 ---
-    async def start_job(self, payload: dict[str, Any]) -> int:
-        # st = await asyncio.to_thread(self._read_state)
-        # opid = st.get("opid",-1) # TODO 에러 구현
-        # code = st.get("state",STATCODE["ERROR"])
-        # self.last_state_code = int(code) if code is not None else None
-        # open_pct = st.get("open_pct",-1) 
-        # self.last_open_pct = int(open_pct)
-
-        opid = await asyncio.to_thread(self._send_command, payload)
+    async def start_job(self, payload: dict[str, Any], deadline: float | None = None) -> int:
+        """
+        작업을 대기열에 넣고 실제로 전송될 때까지 기다려 opid를 돌려준다.
+        더 새 작업에 밀려 버려지면 JobDropped, 남은 시간 안에 못 보내면 DeadlineExceeded
+        """
+        job = Job(payload, deadline, asyncio.get_running_loop().create_future())
+        if self.policy in ("latest", "preempt"):
+            while self._jobs:
+                self._drop(self._jobs.popleft(), "superseded")
+        self._jobs.append(job)
+        if self.policy == "preempt":
+            self._preempt_current(payload)
+        self._job_event.set()
+        self._ensure_worker()
+
+        try:
+            if deadline is None:
+                return await asyncio.shield(job.future)
+            return await asyncio.wait_for(asyncio.shield(job.future), max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            if job in self._jobs:
+                # 아직 대기중이면 보내지 않고 버린다. 이미 전송중이면 _send_command가 남은 시간을 지킨다
+                self._jobs.remove(job)
+                job.future.cancel()
+                self._drop(job, "expired")
+                raise DeadlineExceeded(f"{self.actuator_name}: deadline exceeded waiting in job queue")
+            return await job.future
+        except asyncio.CancelledError:
+            # 호출한 쪽이 끊겼으면 대기중인 작업은 내보내지 않는다
+            if job in self._jobs:
+                self._jobs.remove(job)
+                job.future.cancel()
+                self._drop(job, "cancelled")
+            raise
+
+    async def _execute(self, payload: dict[str, Any], deadline: float | None = None) -> int:
+        self.suppress_reason = None
+        self._seq += 1
+        seq = self._seq
+        await self.dispatch()
+        try:
+            opid = await self._send_command(payload, deadline)
+        except Exception:
+            await self.fail()
+            raise
+        if opid < 0:
+            await self.suppress()
+            return opid
+
+        await self.sent()
+        self._current = payload
+        self._acked = asyncio.get_running_loop().create_future()
+        self._verify_task = asyncio.create_task(
+            self._verify(opid, int(payload.get("duration_sec") or 0), seq, self._acked))
+        self._settling.add(self._verify_task)
+        self._verify_task.add_done_callback(self._settling.discard)
         return opid
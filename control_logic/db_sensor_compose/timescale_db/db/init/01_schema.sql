@@ -3,7 +3,7 @@ CREATE EXTENSION IF NOT EXISTS timescaledb;
 
 -- 2) 테이블
 CREATE TABLE IF NOT EXISTS greenhouse2 (
-  id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+  id BIGINT GENERATED ALWAYS AS IDENTITY,
   time TIMESTAMPTZ NOT NULL,
   time_band SMALLINT,
   DAT SMALLINT,
@@ -90,18 +90,30 @@ CREATE TABLE IF NOT EXISTS greenhouse2 (
   nut_ec_value_status SMALLINT,
   nut_ph_value_status SMALLINT,
   total_flow_value_status SMALLINT,
-  flow_value_status SMALLINT
+  flow_value_status SMALLINT,
+
+  -- 수집 메타 (tick, 장치별 취득 시각/지연, 지터 통계)
+  acq_meta JSONB,
+  -- 빠른 샘플링 그룹의 행 주기 집계 {필드: {n, mean, min, max, last}}
+  agg JSONB,
+
+  -- 하이퍼테이블의 PK는 파티션 컬럼(time)을 포함해야 한다
+  PRIMARY KEY (id, time)
 );
 
 -- 3) 하이퍼테이블 + 인덱스
 SELECT create_hypertable('greenhouse2','time', if_not_exists => TRUE);
 CREATE INDEX IF NOT EXISTS idx_greenhouse2_time ON greenhouse2 (time DESC);
+-- 스풀 재전송 중복 방지 (insert_greenhouse2: ON CONFLICT (time) DO NOTHING, migrations/V006)
+CREATE UNIQUE INDEX IF NOT EXISTS ux_greenhouse2_time ON greenhouse2 (time);
 
+-- 4) 읽기용 뷰 greenhouse2_dense 는 migrate.py 가 만든다 (migrations/R__greenhouse2_dense_view.sql)
 
 
--- 로거 관련
+
+-- 로거 관련 (rule_engine/log_db_handler.ensure_app_logs 가 시작할 때 같은 상태로 맞춘다)
 CREATE TABLE IF NOT EXISTS app_logs (
-  id        BIGSERIAL PRIMARY KEY,
+  id        BIGSERIAL,
   ts        TIMESTAMPTZ NOT NULL,
   level     TEXT NOT NULL,
   logger    TEXT NOT NULL,   -- 앱 이름 (logger name) 저장
@@ -110,13 +122,19 @@ CREATE TABLE IF NOT EXISTS app_logs (
   lineno    INT,
   message   TEXT NOT NULL,
   extra     JSONB,
-  exc_text  TEXT
+  exc_text  TEXT,
+  PRIMARY KEY (id, ts)     -- 하이퍼테이블 유니크 키에는 시간 컬럼 포함
 );
 
--- 인덱스
-CREATE INDEX IF NOT EXISTS idx_app_logs_ts        ON app_logs(ts);
-CREATE INDEX IF NOT EXISTS idx_app_logs_level     ON app_logs(level);
+-- ts 기준 하이퍼테이블 (하루 청크), 7일 지나면 logger별 압축, 90일 지나면 삭제
+SELECT create_hypertable('app_logs', 'ts', chunk_time_interval => INTERVAL '1 day', if_not_exists => TRUE);
+ALTER TABLE app_logs SET (timescaledb.compress, timescaledb.compress_segmentby = 'logger', timescaledb.compress_orderby = 'ts DESC, id DESC');
+SELECT add_compression_policy('app_logs', compress_after => INTERVAL '7 days', if_not_exists => TRUE);
+SELECT add_retention_policy('app_logs', drop_after => INTERVAL '90 days', if_not_exists => TRUE);
+
+-- 인덱스 (ts DESC 는 create_hypertable이 만듦)
 CREATE INDEX IF NOT EXISTS idx_app_logs_logger_ts ON app_logs(logger, ts DESC);
+CREATE INDEX IF NOT EXISTS idx_app_logs_level_ts  ON app_logs(level, ts DESC);
 
 -- extra 검색 자주 할 경우
 CREATE INDEX IF NOT EXISTS idx_app_logs_extra_gin ON app_logs USING GIN (extra jsonb_path_ops);
@@ -0,0 +1,30 @@
+-- greenhouse2_dense 읽기용 뷰 (rule_engine/query.py, get_X_prod_sql, get_X_dev_sql 이 읽음)
+--   - deadband로 저장을 건너뛴 컬럼(NULL)을 max_silence_sec 안의 직전 값으로 채운다
+--   - 그 행의 acq_meta.deadband 에 컬럼 이름이 있을 때만 채운다 (읽기 실패로 NULL인 값은 NULL 그대로)
+--   - 채울 컬럼 / 범위: migrate.py 가 DEADBAND_CONF(센서 register map)의 deadband 섹션을 읽어
+--     berrymind.dense_columns / berrymind.dense_max_silence_sec 로 넘긴다 (deadband가 꺼져 있으면 원본 그대로)
+--   - 반복 마이그레이션: 설정이 바뀌거나 V 마이그레이션이 적용될 때마다 테이블 컬럼 목록으로 다시 만든다
+
+DO $$
+DECLARE
+  dense   text[] := string_to_array(NULLIF(current_setting('berrymind.dense_columns', true), ''), ',');
+  silence int    := COALESCE(NULLIF(current_setting('berrymind.dense_max_silence_sec', true), '')::int, 900);
+  sel     text;
+BEGIN
+  SELECT string_agg(
+           CASE WHEN c.column_name = ANY (COALESCE(dense, '{}'::text[])) THEN
+             format('CASE WHEN g.%1$I IS NULL AND g.acq_meta->''deadband'' @> jsonb_build_array(%2$L::text) '
+                    'THEN (SELECT p.%1$I FROM greenhouse2 p '
+                    'WHERE p.time < g.time AND p.time >= g.time - interval ''%3$s seconds'' '
+                    'AND p.%1$I IS NOT NULL ORDER BY p.time DESC LIMIT 1) ELSE g.%1$I END AS %1$I',
+                    c.column_name, c.column_name, silence)
+           ELSE format('g.%I', c.column_name) END,
+           ', ' ORDER BY c.ordinal_position)
+    INTO sel
+    FROM information_schema.columns c
+   WHERE c.table_schema = current_schema() AND c.table_name = 'greenhouse2';
+
+  -- 컬럼 구성이 바뀌면 CREATE OR REPLACE 가 안 되므로 지우고 다시 (DO 블록 안이라 한 트랜잭션)
+  DROP VIEW IF EXISTS greenhouse2_dense;
+  EXECUTE format('CREATE VIEW greenhouse2_dense AS SELECT %s FROM greenhouse2 g', sel);
+END $$;
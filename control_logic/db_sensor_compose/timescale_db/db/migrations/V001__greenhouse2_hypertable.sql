@@ -0,0 +1,19 @@
+-- greenhouse2 를 time 하이퍼테이블로 맞춘다 (예전 DB: PK = id 인 일반 테이블, acq_meta/agg 컬럼 없음)
+--   - 뒤의 마이그레이션(연속 집계, 압축, time 유니크 인덱스)은 모두 하이퍼테이블 + acq_meta/agg 컬럼을 전제로 한다
+--   - 하이퍼테이블의 PK는 파티션 컬럼을 포함해야 하므로 PK를 (id, time) 으로 바꾼다 (app_logs와 같은 방식)
+--   - 기존 행은 migrate_data => TRUE 로 청크에 옮긴다 (행이 많으면 오래 걸리고 그동안 테이블이 잠김)
+
+ALTER TABLE greenhouse2
+  ADD COLUMN IF NOT EXISTS acq_meta JSONB,
+  ADD COLUMN IF NOT EXISTS agg JSONB;
+
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_index i
+             WHERE i.indrelid = 'greenhouse2'::regclass AND i.indisprimary AND i.indnatts = 1) THEN
+    ALTER TABLE greenhouse2 DROP CONSTRAINT greenhouse2_pkey;
+    ALTER TABLE greenhouse2 ADD PRIMARY KEY (id, time);
+  END IF;
+END $$;
+
+SELECT create_hypertable('greenhouse2', 'time', migrate_data => TRUE, if_not_exists => TRUE);
@@ -0,0 +1,22 @@
+-- 제어 쪽에서 자주 도는 쿼리용 인덱스
+--   greenhouse2: ORDER BY time DESC LIMIT 1, 최근 10분 윈도우 → (time DESC)
+--   predictions: ORDER BY created_at DESC [, id DESC] LIMIT 1 (rule_engine, heartbeat)
+--   app_logs:    ts > NOW() - 1 day ORDER BY ts DESC LIMIT 3 (heartbeat)
+--                → create_hypertable 기본 인덱스 (ts DESC) 로 충분. PK는 (id, ts) 라 이 쿼리엔 안 쓰인다
+-- 하이퍼테이블이 아닌 테이블은 CONCURRENTLY로 (migrate.py가 autocommit으로 실행하므로 가능)
+
+-- create_hypertable이 만드는 greenhouse2_time_idx (time DESC) 와 init의 idx_greenhouse2_time 이 같은 인덱스 → 하나만 남긴다
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_indexes WHERE tablename = 'greenhouse2' AND indexname = 'greenhouse2_time_idx') THEN
+    DROP INDEX IF EXISTS idx_greenhouse2_time;
+  ELSE
+    CREATE INDEX IF NOT EXISTS idx_greenhouse2_time ON greenhouse2 (time DESC);
+  END IF;
+END $$;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_predictions_created_at ON predictions (created_at DESC, id DESC);
+
+ANALYZE greenhouse2;
+ANALYZE predictions;
+ANALYZE app_logs;
@@ -0,0 +1,54 @@
+-- 1분 연속 집계: 피처 파이프라인이 원본 행 대신 읽는다 (get_extra_data/get_X_cagg_sql.py)
+--   - 평균값 컬럼: avg, 실내 온습도/CO2/일사: 분 최소/최대 (agg의 빠른 샘플 min/max 포함) + agg 평균
+--   - 상태/개도 컬럼: 버킷 안 마지막 NULL 아닌 값 (deadband로 비어 있는 행은 건너뜀)
+--   - 실내 온습도/CO2가 모두 0(또는 NULL)인 행은 읽기 실패로 보고 뺀다 (get_X_prod_sql과 같은 기준)
+-- materialized_only = false: 아직 집계 안 된 최근 구간은 원본에서 바로 계산해서 붙여준다
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS greenhouse2_1m
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT
+  time_bucket(INTERVAL '1 minute', time) AS bucket,
+  count(*) AS n,
+  max(id) AS id,
+  avg(outdoor_temp) AS outdoor_temp,
+  avg(outdoor_humidity) AS outdoor_humidity,
+  avg(wind_speed) AS wind_speed,
+  avg(solar_radiation) AS solar_radiation,
+  avg(indoor_temp) AS indoor_temp,
+  avg(indoor_humidity) AS indoor_humidity,
+  avg(indoor_co2) AS indoor_co2,
+  avg(soil_water_content) AS soil_water_content,
+  avg(soil_temp) AS soil_temp,
+  LEAST(min(indoor_temp), min((agg->'indoor_temp'->>'min')::real)) AS indoor_temp_min,
+  GREATEST(max(indoor_temp), max((agg->'indoor_temp'->>'max')::real)) AS indoor_temp_max,
+  avg((agg->'indoor_temp'->>'mean')::real) AS indoor_temp_agg_mean,
+  LEAST(min(indoor_humidity), min((agg->'indoor_humidity'->>'min')::real)) AS indoor_humidity_min,
+  GREATEST(max(indoor_humidity), max((agg->'indoor_humidity'->>'max')::real)) AS indoor_humidity_max,
+  avg((agg->'indoor_humidity'->>'mean')::real) AS indoor_humidity_agg_mean,
+  LEAST(min(indoor_co2), min((agg->'indoor_co2'->>'min')::real)) AS indoor_co2_min,
+  GREATEST(max(indoor_co2), max((agg->'indoor_co2'->>'max')::real)) AS indoor_co2_max,
+  avg((agg->'indoor_co2'->>'mean')::real) AS indoor_co2_agg_mean,
+  LEAST(min(solar_radiation), min((agg->'solar_radiation'->>'min')::real)) AS solar_radiation_min,
+  GREATEST(max(solar_radiation), max((agg->'solar_radiation'->>'max')::real)) AS solar_radiation_max,
+  avg((agg->'solar_radiation'->>'mean')::real) AS solar_radiation_agg_mean,
+  last(rain, time) FILTER (WHERE rain IS NOT NULL) AS rain,
+  last(wind_direction, time) FILTER (WHERE wind_direction IS NOT NULL) AS wind_direction,
+  last(sky_window_left_open_pct, time) FILTER (WHERE sky_window_left_open_pct IS NOT NULL) AS sky_window_left_open_pct,
+  last(sky_window_right_open_pct, time) FILTER (WHERE sky_window_right_open_pct IS NOT NULL) AS sky_window_right_open_pct,
+  last(heat_curtain_open_pct, time) FILTER (WHERE heat_curtain_open_pct IS NOT NULL) AS heat_curtain_open_pct,
+  last(shading_screen_open_pct, time) FILTER (WHERE shading_screen_open_pct IS NOT NULL) AS shading_screen_open_pct,
+  last(fan_status, time) FILTER (WHERE fan_status IS NOT NULL) AS fan_status,
+  last(fcu_status, time) FILTER (WHERE fcu_status IS NOT NULL) AS fcu_status,
+  last(fcu_circulation_status, time) FILTER (WHERE fcu_circulation_status IS NOT NULL) AS fcu_circulation_status,
+  last(fog_status, time) FILTER (WHERE fog_status IS NOT NULL) AS fog_status,
+  last(co2_status, time) FILTER (WHERE co2_status IS NOT NULL) AS co2_status
+FROM greenhouse2
+WHERE NOT (COALESCE(indoor_temp, 0) = 0 AND COALESCE(indoor_humidity, 0) = 0 AND COALESCE(indoor_co2, 0) = 0)
+GROUP BY bucket;
+
+-- 최근 2시간을 1분마다 다시 집계 (늦게 들어온 스풀 재전송분 포함). 그보다 오래된 backfill은 backfill_csv.py가 직접 refresh
+SELECT add_continuous_aggregate_policy('greenhouse2_1m',
+  start_offset => INTERVAL '2 hours',
+  end_offset => INTERVAL '1 minute',
+  schedule_interval => INTERVAL '1 minute',
+  if_not_exists => TRUE);
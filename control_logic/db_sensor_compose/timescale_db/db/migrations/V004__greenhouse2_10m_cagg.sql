@@ -0,0 +1,49 @@
+-- 10분 연속 집계: greenhouse2_1m 위에 쌓는다 (계층형 연속 집계)
+--   avg는 1분 평균의 평균(분 단위 시간 가중), min/max는 1분 min/max의 min/max, 상태는 마지막 NULL 아닌 값
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS greenhouse2_10m
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT
+  time_bucket(INTERVAL '10 minutes', bucket) AS bucket,
+  sum(n) AS n,
+  max(id) AS id,
+  avg(outdoor_temp) AS outdoor_temp,
+  avg(outdoor_humidity) AS outdoor_humidity,
+  avg(wind_speed) AS wind_speed,
+  avg(solar_radiation) AS solar_radiation,
+  avg(indoor_temp) AS indoor_temp,
+  avg(indoor_humidity) AS indoor_humidity,
+  avg(indoor_co2) AS indoor_co2,
+  avg(soil_water_content) AS soil_water_content,
+  avg(soil_temp) AS soil_temp,
+  min(indoor_temp_min) AS indoor_temp_min,
+  max(indoor_temp_max) AS indoor_temp_max,
+  avg(indoor_temp_agg_mean) AS indoor_temp_agg_mean,
+  min(indoor_humidity_min) AS indoor_humidity_min,
+  max(indoor_humidity_max) AS indoor_humidity_max,
+  avg(indoor_humidity_agg_mean) AS indoor_humidity_agg_mean,
+  min(indoor_co2_min) AS indoor_co2_min,
+  max(indoor_co2_max) AS indoor_co2_max,
+  avg(indoor_co2_agg_mean) AS indoor_co2_agg_mean,
+  min(solar_radiation_min) AS solar_radiation_min,
+  max(solar_radiation_max) AS solar_radiation_max,
+  avg(solar_radiation_agg_mean) AS solar_radiation_agg_mean,
+  last(rain, bucket) FILTER (WHERE rain IS NOT NULL) AS rain,
+  last(wind_direction, bucket) FILTER (WHERE wind_direction IS NOT NULL) AS wind_direction,
+  last(sky_window_left_open_pct, bucket) FILTER (WHERE sky_window_left_open_pct IS NOT NULL) AS sky_window_left_open_pct,
+  last(sky_window_right_open_pct, bucket) FILTER (WHERE sky_window_right_open_pct IS NOT NULL) AS sky_window_right_open_pct,
+  last(heat_curtain_open_pct, bucket) FILTER (WHERE heat_curtain_open_pct IS NOT NULL) AS heat_curtain_open_pct,
+  last(shading_screen_open_pct, bucket) FILTER (WHERE shading_screen_open_pct IS NOT NULL) AS shading_screen_open_pct,
+  last(fan_status, bucket) FILTER (WHERE fan_status IS NOT NULL) AS fan_status,
+  last(fcu_status, bucket) FILTER (WHERE fcu_status IS NOT NULL) AS fcu_status,
+  last(fcu_circulation_status, bucket) FILTER (WHERE fcu_circulation_status IS NOT NULL) AS fcu_circulation_status,
+  last(fog_status, bucket) FILTER (WHERE fog_status IS NOT NULL) AS fog_status,
+  last(co2_status, bucket) FILTER (WHERE co2_status IS NOT NULL) AS co2_status
+FROM greenhouse2_1m
+GROUP BY 1;
+
+SELECT add_continuous_aggregate_policy('greenhouse2_10m',
+  start_offset => INTERVAL '1 day',
+  end_offset => INTERVAL '10 minutes',
+  schedule_interval => INTERVAL '10 minutes',
+  if_not_exists => TRUE);
@@ -0,0 +1,18 @@
+-- greenhouse2 네이티브 압축: 7일 지난 청크는 컬럼 압축 (실시간 쿼리는 최근 청크만 읽으므로 영향 없음)
+--   - 구역이 하나라 segmentby 없이 time DESC 로 정렬해서 압축
+--   - 압축된 청크에도 INSERT 가능 (스풀 재전송 / backfill_csv) — 조금 느려질 뿐
+--   - 더 오래된 청크는 archive/archive_parquet.py 로 Parquet에 내보내고 --drop 으로 지운다
+-- 기간을 바꾸려면 새 마이그레이션에서 remove_compression_policy → add_compression_policy
+
+DO $$
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM timescaledb_information.hypertables
+                 WHERE hypertable_name = 'greenhouse2' AND compression_enabled) THEN
+    ALTER TABLE greenhouse2 SET (
+      timescaledb.compress,
+      timescaledb.compress_orderby = 'time DESC'
+    );
+  END IF;
+END $$;
+
+SELECT add_compression_policy('greenhouse2', compress_after => INTERVAL '7 days', if_not_exists => TRUE);
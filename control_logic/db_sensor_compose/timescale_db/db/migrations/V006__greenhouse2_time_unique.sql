@@ -0,0 +1,13 @@
+-- greenhouse2 time 유니크 인덱스: 스풀이 DB에 넣고(commit) 자기 파일에서 지우기 전에 죽으면
+-- 다시 시작할 때 같은 batch를 또 보낸다 → insert_greenhouse2 가 ON CONFLICT (time) DO NOTHING 으로 건너뛰게
+--   - 폴러는 tick마다 한 행이라 time이 곧 행의 키 (backfill_csv도 time 기준으로 중복을 뺀다)
+--   - 하이퍼테이블의 유니크 인덱스는 파티션 컬럼(time)을 포함해야 하는데 time 하나라 그대로 가능
+--   - 압축 청크가 있어도 time이 compress_orderby 컬럼이라 만들 수 있다
+
+-- 1) 이미 들어간 중복은 먼저 지운다 (같은 time이면 먼저 들어간 행 = 가장 작은 id 를 남김)
+DELETE FROM greenhouse2 a
+USING greenhouse2 b
+WHERE a.time = b.time AND a.id > b.id;
+
+-- 2) 유니크 인덱스 (하이퍼테이블은 CONCURRENTLY 불가)
+CREATE UNIQUE INDEX IF NOT EXISTS ux_greenhouse2_time ON greenhouse2 (time);
@@ -0,0 +1,37 @@
+import time
+
+# 천천히 바뀌는 컬럼은 값이 (deadband 이상) 바뀌었을 때만 저장 (register_map의 deadband 섹션)
+#   deadband:
+#     max_silence_sec: 900      # 안 바뀌어도 이 시간마다 한 번은 저장 (greenhouse2_dense 뷰가 찾아보는 범위)
+#     columns:
+#       fcu_status: 0           # 0이면 값이 달라질 때만
+#       soil_temp: 0.1          # |새 값 - 마지막 저장값| > 0.1 일 때만
+# 저장하지 않은 컬럼은 그 행에서 NULL → greenhouse2_dense 뷰 / utils.densify 가 직전 값으로 채운다
+
+class Deadband:
+    def __init__(self, conf: dict | None):
+        conf = conf or {}
+        self.columns: dict[str, float] = {c: float(v or 0) for c, v in (conf.get("columns") or {}).items()}
+        self.max_silence_sec = float(conf.get("max_silence_sec", 900))
+        self._last: dict[str, tuple[float, float]] = {}     # 컬럼 → (마지막 저장값, 저장 시각)
+        self.kept = 0
+        self.suppressed = 0
+
+    def apply(self, row: dict, ts: float | None = None) -> list[str]:
+        """row에서 안 바뀐 컬럼을 뺀다 (row를 바꿈). 뺀 컬럼 이름 목록"""
+        ts = time.time() if ts is None else ts
+        dropped, kept = [], 0
+        for col, band in self.columns.items():
+            v = row.get(col)
+            if v is None:
+                continue
+            last = self._last.get(col)
+            if last is not None and abs(v - last[0]) <= band and ts - last[1] < self.max_silence_sec:
+                del row[col]
+                dropped.append(col)
+                continue
+            self._last[col] = (v, ts)
+            kept += 1
+        self.kept += kept
+        self.suppressed += len(dropped)
+        return dropped
@@ -1,18 +1,31 @@
 from datetime import datetime, timezone
 from sqlalchemy import create_engine, text
-import os
+import json, os
 
 db_url = os.environ.get("DATABASE_URL")
 
 # 호스트=localhost / 컨테이너=timescaledb
-engine = create_engine(db_url)
+# DB가 재시작되면 끊긴 커넥션을 버리고 다시 맺도록 pool_pre_ping
+engine = create_engine(db_url, pool_pre_ping=True)
+
+# JSONB 컬럼 (dict로 넘기면 json 문자열로 바꿔 CAST)
+JSON_COLS = {"acq_meta", "agg"}
+
+# 스키마(컬럼, greenhouse2_dense 뷰)는 db/migrations 에서만 바꾼다. 여기서는 행만 넣는다
 
 def insert_greenhouse2(rows: list[dict]):
+    """
+    여러 행을 한 트랜잭션으로. 행마다 키가 달라도 되고(없는 컬럼은 NULL), JSONB 컬럼은 CAST
+    같은 time 행이 이미 있으면 건너뜀 (스풀이 commit 후 지우기 전에 죽어서 같은 batch를 다시 보낸 경우)
+    """
     if not rows: return
     cols = sorted({k for r in rows for k in r.keys()})
-    named = ",".join(f":{c}" for c in cols)
+    rows = [{c: (json.dumps(r.get(c), ensure_ascii=False) if c in JSON_COLS and r.get(c) is not None else r.get(c))
+             for c in cols}
+            for r in rows]
+    named = ",".join(f"CAST(:{c} AS JSONB)" if c in JSON_COLS else f":{c}" for c in cols)
     colnames = ",".join(cols)
-    stmt = text(f"INSERT INTO greenhouse2 ({colnames}) VALUES ({named})")
+    stmt = text(f"INSERT INTO greenhouse2 ({colnames}) VALUES ({named}) ON CONFLICT (time) DO NOTHING")
     with engine.begin() as conn:
         conn.execute(stmt, rows)
 
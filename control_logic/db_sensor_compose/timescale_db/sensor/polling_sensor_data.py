@@ -9,108 +9,120 @@
 import json
 import yaml
 import sys
-from pymodbus.client import ModbusTcpClient
+from pymodbus.exceptions import ModbusException
 from insert_sensor_data import insert_greenhouse2
+from deadband import Deadband
+from spool import Spool
+from collections import deque
 from datetime import datetime, timezone
-import os, time
+from pathlib import Path
+import asyncio, math, os, statistics, time
 
 # Add project root to path to allow module imports
 sys.path.append('.')
+# 공용 modbus_common 패키지: 컨테이너에서는 /app/modbus_common, 로컬에서는 control_logic/modbus_common
+sys.path.append(str(next((p for p in Path(__file__).resolve().parents if (p / "modbus_common").is_dir()), ".")))
 
-from ksconstants import STATCODE
-from utils import unpack_f32, unpack_i32
-
-def process_device(client, device_id, device_info):
-    """Reads a block of data for a single device and parses it."""
-    print(f"--- Device ID: {device_id} ---")
-    
-    sensor_data = {}
-    all_addrs = []
-    
-    # Combine all addresses to find the required range for this device
-    for group in ['values', 'status']:
-        for item_info in device_info.get(group, {}).values():
-            addr = item_info.get('addr')
-            if isinstance(addr, list):
-                all_addrs.extend(addr)
-            else:
-                all_addrs.append(addr)
-
-    if not all_addrs:
-        print("  - 이 장치에 정의된 주소가 없습니다.")
-        return []
+from modbus_common.regcodec import BlockCodec, DTYPES, WIDTH, register_fields
+from modbus_common.read_plan import MAX_READ_COUNT, plan_reads
+from sampling import StreamingAgg, base_interval, due_groups, load_sampling
+from modbus_common.modbus_conn import ConnectionManager, GatewayUnavailable, parse_gateway
 
-    min_addr = min(all_addrs)
-    max_addr = max(all_addrs)
-    read_count = max_addr - min_addr + 1
-    print(read_count)
-
-    MAX_REG_COUNT = 125
-    results = []
-
-    start = min_addr
-    while start <= max_addr:
-        read_count = min(MAX_REG_COUNT, max_addr - start + 1)
-        print(f"  - Reading block from {start} to {start + read_count - 1} (count: {read_count})...")
-        
-        res = client.read_holding_registers(start, count=read_count, device_id=device_id)
-        results.extend(res.registers)
-        
-        start += read_count
-
-    # print(f"  - Reading block from {min_addr} to {max_addr} (count: {read_count})...")
-    # res = client.read_holding_registers(min_addr, count=read_count, device_id=device_id)
-
-    if res.isError():
-        print("  - 블록 읽기 실패")
-        return []
+MODBUS_TIMEOUT_SEC = float(os.environ.get("MODBUS_TIMEOUT_SEC", "3"))
+POLL_DEVICES = [2, 3, 4, 5]
+JITTER_WINDOW = int(os.environ.get("JITTER_WINDOW", "60"))   # 지터 통계를 낼 최근 주기 수
 
-    # block = res.registers
-    block = results
+def compile_device_plan(device_id, device_info, max_gap=16, max_count=MAX_READ_COUNT, groups=("values", "status")):
+    """
+    장치 하나의 레지스터 맵(groups에 든 그룹만)을 시작할 때 한 번만 읽기 계획으로 컴파일.
+    간격이 max_gap 레지스터보다 벌어진 곳은 나눠 읽고(안 쓰는 구간을 읽지 않도록), 요청 하나는 max_count 이하.
+    반환: [(ReadRequest, 그 요청 블록용 코덱)] — 코덱에는 필드별 오프셋이 미리 계산되어 있다
+    """
+    fields = register_fields(device_info, tuple(groups))
+    if not fields:
+        return []
+    spans = {name: (device_id, addr, WIDTH[DTYPES[dtype]]) for name, (addr, dtype) in fields.items()}
+    plan = []
+    for req in plan_reads(spans, max_gap=max_gap, max_count=max_count):
+        codec = BlockCodec({name: (fields[name][0] - req.start, fields[name][1]) for name in req.members}, req.count)
+        plan.append((req, codec))
+    return plan
 
-    # Parse the fetched block for each sensor
-    for name, info in device_info.get('values', {}).items():
-        addr = info.get('addr')
-        dtype = info.get('dtype')
-        status_info = device_info.get('status', {}).get(f"{name}_status")
-        
+async def process_device(conn, device_id, plan, verbose=True):
+    """
+    읽기 계획대로 요청마다 읽고 디코딩. 요청별로 오류를 확인해서 성공한 요청의 값은 살린다.
+    반환: (값, 메타) — 메타의 failed에 실패한 요청(시작+개수: 오류), partial은 일부만 읽혔을 때 True
+    """
+    if verbose:
+        print(f"--- Device ID: {device_id} ({len(plan)} requests) ---")
+    sensor_data, failed = {}, {}
+    for req, codec in plan:
+        key = f"{req.start}+{req.count}"
         try:
-            if isinstance(addr, list):  # Multi-register value (float32, int32)
-                offset = addr[0] - min_addr
-                reg1 = block[offset]
-                reg2 = block[offset + 1]
-                value = None
-                if dtype == 'float32':
-                    value = unpack_f32(reg1, reg2)  
-                elif dtype == 'int32':
-                    value = unpack_i32(reg1, reg2)
-                sensor_data[name] = value
-                print(f"  - {name}: {value}")
-            else:  # Single register value
-                offset = addr - min_addr
-                value = block[offset]
-                sensor_data[name] = value
-                print(f"  - {name}: {value}")
-
-            # Add status if it exists
-            if status_info:
-                status_addr = status_info['addr']
-                status_offset = status_addr - min_addr
-                status_val = block[status_offset]
-                sensor_data[f"{name}_status"] = status_val
-                # print(f"    상태: {STATCODE(status_val)}")
-        
-
-        except IndexError:
-            print(f"  - {name}: 파싱 오류 (주소 범위 문제)")
+            # 연결이 끊겨 있으면 여기서 다시 연결 (backoff 중이면 GatewayUnavailable)
+            async with conn.transaction() as client:
+                res = await asyncio.wait_for(client.read_holding_registers(req.start, count=req.count, device_id=device_id),
+                                             MODBUS_TIMEOUT_SEC)
+        except GatewayUnavailable as e:
+            failed[key] = str(e)
+            continue
+        except (asyncio.TimeoutError, ModbusException, OSError) as e:
+            conn.record_failure(e)
+            failed[key] = repr(e)
+            continue
+        conn.record_success()
+        if res.isError():
+            print(f"  - 블록 읽기 실패 {key}: {res}")
+            failed[key] = str(res)
+            continue
+        try:
+            sensor_data.update(codec.decode(res.registers))
         except Exception as e:
-            print(f"  - {name}: 파싱 중 알 수 없는 오류 발생: {e}")
-    
-    return sensor_data
+            print(f"  - 파싱 오류 {key}: {e}")
+            failed[key] = repr(e)
+    if verbose:
+        for name, value in sensor_data.items():
+            print(f"  - {name}: {value}")
+    meta = {"requests": len(plan), "partial": bool(failed) and bool(sensor_data)}
+    if failed:
+        meta["failed"] = failed
+        meta["missing"] = sorted(name for req, _ in plan if f"{req.start}+{req.count}" in failed for name in req.members)
+    return sensor_data, meta
 
 # --- Main Execution ---
 
-def main():
+def next_tick(now: float, interval: float) -> float:
+    # 벽시계 기준 다음 경계 (interval=60이면 매 정각 분)
+    return (math.floor(now / interval) + 1) * interval
+
+async def sleep_until(t: float):
+    # asyncio.sleep은 monotonic 기준이라 벽시계(time.time)로 남은 시간을 다시 확인
+    while (left := t - time.time()) > 0:
+        await asyncio.sleep(left)
+
+def iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat(timespec="milliseconds")
+
+async def read_device(conn, dev_id, plan, tick, verbose=True):
+    """장치 하나를 읽고 (값, 취득 메타) 반환. 취득 시각은 마지막 요청 응답을 받은 시각"""
+    t0 = time.time()
+    data, meta = await process_device(conn, dev_id, plan, verbose)
+    meta["ok"] = "failed" not in meta
+    t1 = time.time()
+    meta.update({"t": iso(t1), "offset_ms": round((t1 - tick) * 1000, 1), "dur_ms": round((t1 - t0) * 1000, 1)})
+    return data, meta
+
+def jitter_stats(lags: deque) -> dict:
+    # 최근 주기들의 틱 대비 깨어난 지연(ms)
+    vals = sorted(lags)
+    return {
+        "n": len(vals),
+        "mean_ms": round(statistics.fmean(vals), 2),
+        "p95_ms": round(vals[min(len(vals) - 1, int(len(vals) * 0.95))], 2),
+        "max_ms": round(vals[-1], 2),
+    }
+
+async def main():
     # Load configurations
     with open('conf.json', 'r') as f:
         config = json.load(f)
@@ -119,47 +131,129 @@ def main():
 
     interval = int(os.environ.get("POLL_INTERVAL_SEC", "60"))  # 기본값 60
 
-    
-    for i in range(5):
-        # Connect to Modbus server
-        client = ModbusTcpClient(config['modbus_ip'], port=config['modbus_port'])
-        if not client.connect():
-            print(f"Modbus 서버에 연결할 수 없습니다. 재시도 {i+1}")
-        else:
-            break
-    else:
-        print("Modbus 서버에 연결할 수 없어 종료합니다.")
-        exit()
-    
-
     # Process all devices and collect data
     devices = sensor_map.get('devices', {})
+    targets = [dev_id for dev_id in POLL_DEVICES if dev_id in devices]
+
+    # 그룹별 샘플 주기: 행 주기(interval)보다 빠른 그룹은 매 샘플을 집계하고 행에는 mean/min/max/last를 agg로
+    rates = load_sampling(sensor_map.get('sampling'), interval)
+    step = base_interval(rates)
+    fast = {g for g, rate in rates.items() if rate < interval}
+    print(f"sampling {rates} (tick {step}s, row {interval}s)")
+
+    # 레지스터 맵은 시작할 때 한 번만 읽기 계획으로 컴파일 (read_plan.max_gap 보다 벌어진 구간은 나눠 읽음)
+    # tick마다 읽을 그룹 조합이 달라서 조합별로 컴파일 (같이 읽을 때는 그룹을 섞어 한 요청으로)
+    read_conf = sensor_map.get('read_plan') or {}
+    combos = {due_groups(rates, t) for t in range(0, interval, step)}
+    plans = {(dev_id, combo): compile_device_plan(dev_id, devices[dev_id], max_gap=int(read_conf.get('max_gap', 16)),
+                                                  max_count=int(read_conf.get('max_count', MAX_READ_COUNT)), groups=combo)
+             for dev_id in targets for combo in combos}
+    for (dev_id, combo), plan in plans.items():
+        print(f"device {dev_id} {'+'.join(combo)} read plan: {[(req.start, req.count) for req, _ in plan]}")
+    fast_fields = {name for dev_id in targets for name in register_fields(devices[dev_id], tuple(fast))}
+
+    # 천천히 바뀌는 컬럼은 바뀔 때만 저장 (읽을 때는 greenhouse2_dense 뷰로 채워서)
+    # 뷰는 migrate.py가 같은 deadband 섹션으로 만든다 → 설정을 바꾸면 migrate도 다시 돌릴 것
+    deadband = Deadband(sensor_map.get('deadband'))
+    if deadband.columns:
+        print(f"deadband {deadband.columns} (max_silence {deadband.max_silence_sec:.0f}s)")
+
+    # 게이트웨이 연결은 ConnectionManager가 관리: 서버가 꺼져 있어도 종료하지 않고 backoff를 두고 다시 붙는다.
+    # 장치마다 다른 게이트웨이를 쓰면 register map의 devices.<id>.gateway: "host:port"
+    manager = ConnectionManager(timeout=MODBUS_TIMEOUT_SEC,
+                                backoff_max=float(os.environ.get("MODBUS_BACKOFF_MAX_SEC", "30")),
+                                health_interval=float(os.environ.get("MODBUS_HEALTH_SEC", "10")))
+    # compose에서는 MODBUS_IP/MODBUS_PORT 로 브로커를 가리킨다 (없으면 conf.json)
+    default_gw = (os.environ.get("MODBUS_IP", config['modbus_ip']),
+                  int(os.environ.get("MODBUS_PORT", config['modbus_port'])))
+    conns = {}
+    for dev_id in targets:
+        info = devices[dev_id]
+        conns[dev_id] = manager.get(*(parse_gateway(info.get('gateway'), default_gw[1]) or default_gw))
+        if conns[dev_id].probe is None:
+            conns[dev_id].probe = (dev_id, min(addr for addr, _ in register_fields(info).values()))
+    await manager.start()
+
+    # 모든 행은 로컬 스풀(SQLite WAL)에 먼저 적고, 백그라운드에서 모아서 DB로 (DB가 죽어 있어도 데이터를 잃지 않음)
+    spool = Spool(os.environ.get("SPOOL_PATH", "spool/greenhouse2.db"), insert_greenhouse2,
+                  batch_size=int(os.environ.get("SPOOL_BATCH", "500")),
+                  backoff_max=float(os.environ.get("SPOOL_BACKOFF_MAX_SEC", "300")))
+    spool.start()
+
+    # 읽는 시간이 주기에 더해져 밀리지 않도록 벽시계 경계(tick)에 맞춰 깨어난다.
+    # 한 연결(pymodbus 클라이언트)은 한 번에 트랜잭션 하나라 같은 게이트웨이의 장치는 차례로 읽고,
+    # 게이트웨이(devices.<id>.gateway)가 다른 장치끼리만 동시에 읽는다.
+    # 행의 time은 행 tick(정각), 장치별 실제 취득 시각/지연은 acq_meta에
+    lags = deque(maxlen=JITTER_WINDOW)
+    agg = StreamingAgg()
+    samples = 0                 # 이번 행 창에서 빠른 그룹을 읽은 횟수
+    tick = next_tick(time.time(), step)
     while True:
         try:
-            time.sleep(interval)
+            await sleep_until(tick)
+            lag_ms = (time.time() - tick) * 1000
+            lags.append(lag_ms)
+            row_tick = round(tick) % interval == 0
+            combo = due_groups(rates, tick)
+            if row_tick:
+                print(f"\n=== tick {iso(tick)} (+{lag_ms:.1f}ms) ===")
+            active = [d for d in targets if plans[(d, combo)]]
+            by_conn = {}
+            for d in active:
+                by_conn.setdefault(conns[d].key, []).append(d)
+
+            async def read_conn(devs):
+                return [await read_device(conns[d], d, plans[(d, combo)], tick, verbose=row_tick) for d in devs]
+
+            outs = await asyncio.gather(*(read_conn(devs) for devs in by_conn.values()))
+            by_dev = {d: out for devs, res in zip(by_conn.values(), outs) for d, out in zip(devs, res)}
+            results = [by_dev[d] for d in active]
             all_sensor_data = {}
-            # Process each device and collect data
-            for dev_id in [2, 3, 4, 5]:
-                if dev_id in devices:
-                    print(f"\nProcessing device {dev_id}...")
-                    device_data = process_device(client, dev_id, devices[dev_id])
-                    if device_data:  # Only extend if we got data back
-                        all_sensor_data.update(device_data)
-            
-            # Print the final JSON output
-            print("\n=== Sensor Data ===")
-            print(json.dumps(all_sensor_data, ensure_ascii=False, indent=2))
-            all_sensor_data.update({"time": datetime.now(timezone.utc)})
-            insert_greenhouse2([all_sensor_data])
+            for device_data, _ in results:
+                all_sensor_data.update(device_data)
+            if fast & set(combo):
+                agg.add({k: v for k, v in all_sensor_data.items() if k in fast_fields})
+                samples += 1
+            if row_tick:
+                cycle_ms = (time.time() - tick) * 1000
+                window = agg.flush()
+                # 빠른 그룹은 이번 tick 읽기가 실패했어도 창 안의 마지막 값으로 채운다
+                for name, a in window.items():
+                    all_sensor_data.setdefault(name, a["last"])
+
+                # Print the final JSON output
+                print("\n=== Sensor Data ===")
+                print(json.dumps(all_sensor_data, ensure_ascii=False, indent=2))
+                jitter = jitter_stats(lags)
+                acq_meta = {
+                    "tick": iso(tick),
+                    "lag_ms": round(lag_ms, 2),
+                    "cycle_ms": round(cycle_ms, 1),
+                    "devices": {str(d): meta for d, (_, meta) in zip(active, results)},
+                    "jitter": jitter,
+                    "samples": samples,
+                    "rates": rates,
+                    "spool": {k: v for k, v in spool.stats().items() if k in ("pending", "lag_sec", "failures")},
+                }
+                print(f"cycle {cycle_ms:.0f}ms, samples {samples}, jitter {jitter}")
+                all_sensor_data.update({"time": datetime.fromtimestamp(tick, timezone.utc), "acq_meta": acq_meta,
+                                        "agg": window or None})
+                samples = 0
+                dropped = deadband.apply(all_sensor_data, tick)
+                if dropped:
+                    acq_meta["deadband"] = dropped     # NULL이 읽기 실패가 아니라 '안 바뀜'인 컬럼
+                spool.put(all_sensor_data)
+                print(f"spool {spool.stats()}")
         except Exception as e:
+            # 연결은 닫지 않는다 (끊긴 연결은 다음 주기에 ConnectionManager가 다시 맺음)
             print(f"[ERROR] {e}")
-            # Close the connection
             print("\n=== Sensor Error ===")
-            client.close()
+            print(json.dumps(manager.stats(), ensure_ascii=False))
+        # 주기를 넘겨 버린 tick은 건너뛰고 다음 경계로 (밀린 주기를 몰아서 읽지 않음)
+        prev, tick = tick, next_tick(time.time(), step)
+        missed = round((tick - prev) / step) - 1
+        if missed > 0:
+            print(f"[WARN] 주기 초과로 tick {missed}개 건너뜀")
 
 if __name__ == "__main__":
-    main()
-
-
-
-
+    asyncio.run(main())
@@ -0,0 +1,56 @@
+import math
+from functools import reduce
+
+# 레지스터 그룹별 샘플링 주기 (register_map의 sampling 섹션)
+#   sampling:
+#     groups: {values: 5, status: 60}   # 그룹 → 읽는 주기(초), 행 주기(POLL_INTERVAL_SEC)의 약수
+# 행 주기보다 빠른 그룹의 값은 행 주기 동안 mean/min/max/last로 모아서 agg 컬럼에 넣는다
+
+def load_sampling(conf: dict | None, interval: int, groups: tuple[str, ...] = ("values", "status")) -> dict[str, int]:
+    """그룹 → 샘플 주기(초). 설정이 없으면 모든 그룹을 행 주기로"""
+    rates = {g: interval for g in groups}
+    for g, rate in ((conf or {}).get("groups") or {}).items():
+        rate = int(rate)
+        if rate <= 0 or interval % rate:
+            raise ValueError(f"sampling.groups.{g}={rate}s must divide POLL_INTERVAL_SEC={interval}")
+        rates[g] = rate
+    return rates
+
+def base_interval(rates: dict[str, int]) -> int:
+    # 모든 그룹 주기의 최대공약수마다 깨어난다
+    return reduce(math.gcd, rates.values())
+
+def due_groups(rates: dict[str, int], tick: float) -> tuple[str, ...]:
+    # 벽시계 tick이 그룹 주기의 배수인 그룹 (정렬된 튜플: 읽기 계획 캐시 키)
+    return tuple(sorted(g for g, rate in rates.items() if round(tick) % rate == 0))
+
+
+class StreamingAgg:
+    """
+    필드별 n/sum/min/max/last 를 샘플이 들어올 때마다 갱신 (샘플을 쌓아두지 않음).
+    flush()가 창 하나의 집계를 돌려주고 비운다.
+    """
+    def __init__(self):
+        self._acc: dict[str, list] = {}
+
+    def add(self, values: dict):
+        for name, v in values.items():
+            if v is None or (isinstance(v, float) and not math.isfinite(v)):
+                continue
+            acc = self._acc.get(name)
+            if acc is None:
+                self._acc[name] = [1, v, v, v, v]
+            else:
+                acc[0] += 1
+                acc[1] += v
+                if v < acc[2]:
+                    acc[2] = v
+                if v > acc[3]:
+                    acc[3] = v
+                acc[4] = v
+
+    def flush(self) -> dict[str, dict]:
+        out = {name: {"n": n, "mean": s / n, "min": lo, "max": hi, "last": last}
+               for name, (n, s, lo, hi, last) in self._acc.items()}
+        self._acc = {}
+        return out
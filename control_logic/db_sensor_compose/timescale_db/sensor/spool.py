@@ -0,0 +1,122 @@
+import asyncio, json, sqlite3, time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable
+
+# 행의 datetime 값은 {"$dt": iso} 로 저장했다가 되살린다
+def _encode(v):
+    if isinstance(v, datetime):
+        return {"$dt": v.isoformat()}
+    raise TypeError(f"not JSON serializable: {type(v)}")
+
+def _decode(d: dict):
+    if len(d) == 1 and "$dt" in d:
+        return datetime.fromisoformat(d["$dt"])
+    return d
+
+
+class Spool:
+    """
+    DB에 넣기 전에 모든 행을 로컬 SQLite(WAL)에 먼저 적어두는 append-only 스풀.
+    백그라운드 flusher가 오래된 것부터 batch_size개씩 insert_fn으로 보내고, 성공하면 지운다.
+    DB가 죽어 있으면 backoff_min → backoff_max 로 늘려가며 재시도하고, 살아나면 밀린 행을 순서대로 다시 보낸다.
+    DB commit과 스풀 삭제 사이에 죽으면 같은 batch를 다시 보내므로 insert_fn은 중복 행을 건너뛰어야 한다
+    (insert_greenhouse2: ON CONFLICT (time) DO NOTHING).
+    """
+    def __init__(self, path: str, insert_fn: Callable[[list[dict]], None], batch_size: int = 500,
+                 flush_interval: float = 5.0, backoff_min: float = 1.0, backoff_max: float = 300.0):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.insert_fn = insert_fn          # 여러 행을 한 번에 넣는 함수 (스레드에서 호출)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")     # WAL에서는 전원이 나가도 마지막 커밋 몇 개만 잃는다
+        self.db.execute("CREATE TABLE IF NOT EXISTS spool (id INTEGER PRIMARY KEY AUTOINCREMENT, ts REAL NOT NULL, row TEXT NOT NULL)")
+        self.db.commit()
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._backoff = backoff_min
+        # 메트릭
+        self.flushed = 0
+        self.batches = 0
+        self.failures = 0
+        self.last_error: str | None = None
+        self.last_flush_at: float | None = None
+        self.replay_rows_per_sec = 0.0      # 마지막 배치 처리 속도
+
+    def put(self, row: dict):
+        self.db.execute("INSERT INTO spool (ts, row) VALUES (?, ?)",
+                        (time.time(), json.dumps(row, ensure_ascii=False, default=_encode)))
+        self.db.commit()
+        self._wake.set()
+
+    def pending(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+
+    def lag_sec(self) -> float:
+        # 아직 DB에 못 넣은 가장 오래된 행이 스풀에 들어온 뒤 지난 시간
+        oldest = self.db.execute("SELECT MIN(ts) FROM spool").fetchone()[0]
+        return round(time.time() - oldest, 1) if oldest is not None else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending(),
+            "lag_sec": self.lag_sec(),
+            "flushed": self.flushed,
+            "batches": self.batches,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "replay_rows_per_sec": round(self.replay_rows_per_sec, 1),
+            "file_bytes": Path(self.path).stat().st_size,
+        }
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    async def flush_once(self) -> int:
+        """가장 오래된 batch_size개를 보낸다. 보낸 행 수 (실패하면 예외)"""
+        batch = self.db.execute("SELECT id, row FROM spool ORDER BY id LIMIT ?", (self.batch_size,)).fetchall()
+        if not batch:
+            return 0
+        rows = [json.loads(r, object_hook=_decode) for _, r in batch]
+        t0 = time.monotonic()
+        await asyncio.to_thread(self.insert_fn, rows)
+        # DB 커밋이 끝난 뒤에만 지운다 (여기서 죽으면 다음에 같은 배치를 다시 보냄)
+        self.db.execute("DELETE FROM spool WHERE id <= ?", (batch[-1][0],))
+        self.db.commit()
+        self.flushed += len(rows)
+        self.batches += 1
+        self.last_flush_at = time.time()
+        self.replay_rows_per_sec = len(rows) / max(time.monotonic() - t0, 1e-6)
+        return len(rows)
+
+    async def _run(self):
+        while True:
+            try:
+                n = await self.flush_once()
+            except Exception as e:
+                self.failures += 1
+                self.last_error = repr(e)
+                print(f"[spool] DB 저장 실패 ({self.pending()}행 대기, {self._backoff:.1f}s 후 재시도): {e!r}")
+                await asyncio.sleep(self._backoff)
+                self._backoff = min(self._backoff * 2, self.backoff_max)
+                continue
+            if self._backoff > self.backoff_min and n:
+                print(f"[spool] DB 복구, 밀린 행 전송 중 ({self.pending()}행 남음, {self.replay_rows_per_sec:.0f}행/s)")
+            self._backoff = self.backoff_min
+            if n == self.batch_size:
+                continue                    # 밀린 게 더 있으면 바로 다음 배치
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
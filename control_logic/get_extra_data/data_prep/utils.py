@@ -349,6 +349,27 @@ def assert_bounds(df, bounds: dict):
             assert s.min() >= lo and s.max() <= hi, f"{col} not clipped properly"
     print(f"[{bounds.keys()}] bounds check passed")
 
+def densify(
+    df: pd.DataFrame,
+    cols: Optional[Iterable[str]] = None,
+    freq: str = "1min",
+    time_col: str = "time",
+    limit: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    deadband로 '안 바뀌어서' 저장하지 않은 값(NULL)을 직전 값으로 채워 freq 간격 격자로 만든다.
+    (greenhouse2_dense 뷰를 쓰지 않고 greenhouse2를 직접 읽었을 때)
+      - cols: 채울 컬럼 (None이면 전부). 나머지 컬럼은 NaN 그대로
+      - limit: 최대 몇 칸까지 채울지 (max_silence_sec / freq 정도, None이면 제한 없음)
+    """
+    df = df.copy()
+    df[time_col] = pd.to_datetime(df[time_col])
+    df = df.drop_duplicates(subset=[time_col]).set_index(time_col).sort_index()
+    df = df.asfreq(freq)
+    cols = list(df.columns) if cols is None else [c for c in cols if c in df.columns]
+    df[cols] = df[cols].ffill(limit=limit)
+    return df.reset_index()
+
 """
 y_interval_minutes = y 데이터를 몇분 간격으로 모을지 10분
 horizon_min = 지금 시점으로부터 몇 분 후를 예측하는지 35분
@@ -0,0 +1,41 @@
+# get_X_prod_sql 과 같은 컬럼을 원본 행 대신 1분 연속 집계(greenhouse2_1m, db/migrations/V003)에서 읽는다.
+# - 최근 10개 1분 버킷 (현재 진행 중인 분 포함, materialized_only=false라 아직 집계 안 된 구간도 나옴)
+# - 빈 분은 time_bucket_gapfill + locf로 직전 값, 상태/개도 컬럼은 창 이전의 마지막 값까지 찾아서 채움 (deadband)
+# - 실내 온습도/CO2가 모두 0인 행은 집계에서 이미 빠져 있음
+# X_SOURCE=cagg 일 때 get_extra_data_runner가 사용
+
+AVG_COLS = ["outdoor_temp", "wind_speed", "solar_radiation", "indoor_temp", "indoor_humidity", "indoor_co2"]
+LAST_COLS = ["wind_direction", "sky_window_left_open_pct", "sky_window_right_open_pct", "heat_curtain_open_pct",
+             "shading_screen_open_pct", "rain", "fan_status", "fcu_status", "fcu_circulation_status", "fog_status",
+             "co2_status"]
+AGG_COLS = ["indoor_temp", "indoor_humidity", "indoor_co2", "solar_radiation"]
+
+START = "time_bucket(INTERVAL '1 minute', NOW()) - INTERVAL '9 minutes'"
+END = "time_bucket(INTERVAL '1 minute', NOW()) + INTERVAL '1 minute'"
+
+
+def _prev(col: str) -> str:
+    # 창 시작 전 마지막 NULL 아닌 값 (창 안에 한 번도 안 바뀐 deadband 컬럼용)
+    return (f"(SELECT {col} FROM greenhouse2_1m WHERE bucket < {START} AND {col} IS NOT NULL "
+            f"ORDER BY bucket DESC LIMIT 1)")
+
+def get_X_sql():
+    sel = ["locf(max(id)) AS id"]
+    sel += [f"locf(avg({c}), treat_null_as_missing => true) AS {c}" for c in AVG_COLS]
+    sel += [f"locf(max({c}), prev => {_prev(c)}, treat_null_as_missing => true) AS {c}" for c in LAST_COLS]
+    for c in AGG_COLS:
+        sel += [f"locf(avg({c}_agg_mean), treat_null_as_missing => true) AS {c}_agg_mean",
+                f"locf(min({c}_min), treat_null_as_missing => true) AS {c}_agg_min",
+                f"locf(max({c}_max), treat_null_as_missing => true) AS {c}_agg_max"]
+    cols = ",\n        ".join(sel)
+    return f"""SELECT * FROM (
+    SELECT
+        time_bucket_gapfill(INTERVAL '1 minute', bucket, {START}, {END}) AS time,
+        {cols}
+    FROM greenhouse2_1m
+    WHERE bucket >= {START}
+      AND bucket < {END}
+    GROUP BY 1
+) x
+WHERE indoor_temp IS NOT NULL  -- 창 앞쪽에 데이터가 아예 없던 분은 뺀다
+ORDER BY time ASC;"""
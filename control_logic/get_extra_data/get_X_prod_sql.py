@@ -18,8 +18,21 @@ def get_X_sql():
     fcu_status,
     fcu_circulation_status,
     fog_status,
-    co2_status
-FROM greenhouse2
+    co2_status,
+    -- 빠른 샘플링 분 단위 집계 (agg 컬럼, 없던 시절 행은 NULL)
+    (agg->'indoor_temp'->>'mean')::real AS indoor_temp_agg_mean,
+    (agg->'indoor_temp'->>'min')::real AS indoor_temp_agg_min,
+    (agg->'indoor_temp'->>'max')::real AS indoor_temp_agg_max,
+    (agg->'indoor_humidity'->>'mean')::real AS indoor_humidity_agg_mean,
+    (agg->'indoor_humidity'->>'min')::real AS indoor_humidity_agg_min,
+    (agg->'indoor_humidity'->>'max')::real AS indoor_humidity_agg_max,
+    (agg->'indoor_co2'->>'mean')::real AS indoor_co2_agg_mean,
+    (agg->'indoor_co2'->>'min')::real AS indoor_co2_agg_min,
+    (agg->'indoor_co2'->>'max')::real AS indoor_co2_agg_max,
+    (agg->'solar_radiation'->>'mean')::real AS solar_radiation_agg_mean,
+    (agg->'solar_radiation'->>'min')::real AS solar_radiation_agg_min,
+    (agg->'solar_radiation'->>'max')::real AS solar_radiation_agg_max
+FROM greenhouse2_dense
 WHERE time >= NOW() - INTERVAL '10 minutes'
   AND time <= NOW()
   AND NOT (
@@ -0,0 +1,397 @@
+# 실행: python modbus_simulator.py --port 5020
+#   action I/O: act_conf.yaml connect.host/port 를 이 주소로
+#   센서 폴러: conf.json modbus_ip/modbus_port 를 이 주소로
+#
+# 온실 게이트웨이(192.168.0.10:502) 대신 쓰는 Modbus TCP 시뮬레이터 (표준 라이브러리 asyncio만 사용)
+# - act_conf.yaml 의 구동기 상태/명령 블록, register_map_split_status.yaml 의 센서 값 레지스터를 그대로 서빙
+# - 구동기: 명령을 쓰면 opid 반영, remain_sec 카운트다운, 개폐율 램프, 양액기 준비→공급→마무리
+# - 센서: float32 값을 하루 주기 + 잡음으로 만들어 냄
+# - 지원 function code: 3(read holding), 6(write single), 16(write multiple), 23(read/write multiple)
+# - 지연/오류 주입: --latency-ms --jitter-ms --error-rate --drop-rate --no-fc23
+
+import argparse, asyncio, math, random, struct, time
+from array import array
+from collections import Counter
+from pathlib import Path
+import yaml
+
+HERE = Path(__file__).resolve().parent
+DEFAULT_ACT_CONF = HERE.parent / "action_compose" / "action_io_component" / "act_conf.yaml"
+DEFAULT_REGISTER_MAP = HERE.parent / "db_sensor_compose" / "timescale_db" / "sensor" / "register_map_split_status.yaml"
+
+# ---- 프로토콜 상수 (ksconstants와 같은 값) ----
+READY, ERROR, WORKING = 0, 1, 201
+OPENING, CLOSING = 301, 302
+PREPARING, SUPPLYING, FINISHING = 401, 402, 403
+
+OFF, ON, TIMED_ON = 0, 201, 202
+OPEN, CLOSE, TIMED_OPEN, TIMED_CLOSE = 301, 302, 303, 304
+ONCE_WATER, JUST_WATER, NUT_WATER = 401, 402, 403
+
+# Modbus 예외 코드
+ILLEGAL_FUNCTION, ILLEGAL_ADDRESS, ILLEGAL_VALUE, DEVICE_FAILURE = 1, 2, 3, 4
+
+# ---- 구동기 레지스터 레이아웃 (action I/O의 *_actuator.py 와 같은 오프셋) ----
+LAYOUTS = {
+    "switch": {
+        "status": {"state": 1, "opid": 0, "remain": 2},
+        "cmd": {"cmd": 0, "opid": 1, "duration": 2},
+    },
+    "retractable": {
+        "status": {"state": 1, "opid": 0, "remain": 2, "open_pct": 4},
+        "cmd": {"cmd": 0, "opid": 1, "duration": 2},
+    },
+    "nutsupply": {
+        "status": {"state": 0, "area": 1, "alarm": 2, "opid": 3, "remain": 4},
+        "cmd": {"cmd": 0, "opid": 1, "start_area": 2, "end_area": 3, "duration": 4},
+    },
+}
+
+def actuator_class(name: str) -> str:
+    if name in {"SKY_WINDOW_LEFT", "SKY_WINDOW_RIGHT", "SHADING_SCREEN", "HEAT_CURTAIN"}:
+        return "retractable"
+    if name in {"NUTRIENT_PUMP"}:
+        return "nutsupply"
+    return "switch"
+
+# 센서 값 범위 (이름에 들어간 단어 → (낮 최소, 낮 최대)), 하루 주기로 오간다
+SENSOR_RANGES = [
+    ("outdoor_temp", (5.0, 25.0)),
+    ("temp", (16.0, 28.0)),
+    ("humidity", (55.0, 90.0)),
+    ("co2", (420.0, 900.0)),
+    ("solar", (0.0, 850.0)),
+    ("wind_speed", (0.0, 4.0)),
+    ("wind_direction", (0.0, 360.0)),
+    ("rain", (0.0, 0.0)),
+    ("soil_water", (25.0, 40.0)),
+    ("ph", (5.6, 6.4)),
+    ("ec", (1.2, 2.4)),
+    ("flow", (0.0, 8.0)),
+]
+
+
+class Registers:
+    """slave(unit)별 홀딩 레지스터 65536개"""
+    def __init__(self):
+        self.units: dict[int, array] = {}
+
+    def unit(self, unit: int) -> array:
+        if unit not in self.units:
+            self.units[unit] = array("H", bytes(2 * 65536))
+        return self.units[unit]
+
+    def read(self, unit: int, addr: int, count: int) -> list[int]:
+        return self.unit(unit)[addr:addr + count].tolist()
+
+    def write(self, unit: int, addr: int, values: list[int]):
+        self.unit(unit)[addr:addr + len(values)] = array("H", values)
+
+    def get_i32(self, unit: int, addr: int) -> int:
+        return struct.unpack("<i", struct.pack("<HH", *self.read(unit, addr, 2)))[0]
+
+    def set_i32(self, unit: int, addr: int, v: int):
+        self.write(unit, addr, list(struct.unpack("<HH", struct.pack("<i", int(v)))))
+
+    def set_f32(self, unit: int, addr: int, v: float):
+        self.write(unit, addr, list(struct.unpack("<HH", struct.pack("<f", float(v)))))
+
+
+class SimActuator:
+    def __init__(self, name: str, reg: dict, regs: Registers, ack_delay: float, ramp_pct_per_sec: float):
+        self.name = name
+        self.kind = actuator_class(name)
+        self.unit = int(reg["device_id"])
+        self.state_addr = int(reg["state_start_addr"])
+        self.cmd_addr = int(reg["cmd_start_addr"])
+        self.status = LAYOUTS[self.kind]["status"]
+        self.cmd = LAYOUTS[self.kind]["cmd"]
+        self.cmd_cnt = max(self.cmd.values()) + (2 if "duration" in self.cmd else 1)
+        self.regs = regs
+        self.ack_delay = ack_delay
+        self.ramp = ramp_pct_per_sec
+        # 내부 상태
+        self.state = READY
+        self.opid = 0
+        self.remain = 0.0
+        self.open_pct = 0.0
+        self.area = 0
+        self.phase_until = 0.0      # 양액기 준비/마무리 단계 끝나는 시각
+        self.target = None          # 개폐 목표(0/100), None이면 시간제
+        self.pending: tuple[float, int] | None = None   # (반영 시각, opid): 장치가 opid를 늦게 반영하는 것 흉내
+        self.commands = 0
+        self.publish()
+
+    def covers(self, unit: int, addr: int, count: int) -> bool:
+        return unit == self.unit and addr <= self.cmd_addr < addr + count
+
+    def on_write(self):
+        """명령 블록에 쓰기가 들어왔을 때 호출"""
+        vals = self.regs.read(self.unit, self.cmd_addr, self.cmd_cnt)
+        code, opid = vals[self.cmd["cmd"]], vals[self.cmd["opid"]]
+        duration = self.regs.get_i32(self.unit, self.cmd_addr + self.cmd["duration"])
+        self.commands += 1
+        now = time.monotonic()
+        if code == OFF:
+            self.state, self.remain, self.target = READY, 0, None
+        elif code == ON:
+            self.state, self.remain = WORKING, 0
+        elif code == TIMED_ON:
+            self.state, self.remain = WORKING, max(duration, 0)
+        elif code in (OPEN, CLOSE):
+            self.state = OPENING if code == OPEN else CLOSING
+            self.target, self.remain = (100.0 if code == OPEN else 0.0), 0
+        elif code in (TIMED_OPEN, TIMED_CLOSE):
+            self.state = OPENING if code == TIMED_OPEN else CLOSING
+            self.target, self.remain = None, max(duration, 0)
+        elif code in (ONCE_WATER, JUST_WATER, NUT_WATER):
+            self.state, self.remain = PREPARING, max(duration, 0)
+            self.area = vals[self.cmd["start_area"]] if "start_area" in self.cmd else 1
+            self.phase_until = now + 2.0
+        else:
+            self.state = ERROR
+        self.pending = (now + self.ack_delay, opid)
+
+    def tick(self, dt: float):
+        now = time.monotonic()
+        if self.pending is not None and now >= self.pending[0]:
+            self.opid = self.pending[1]
+            self.pending = None
+        if self.state == WORKING and self.remain > 0:
+            self.remain -= dt
+            if self.remain <= 0:
+                self.state, self.remain = READY, 0
+        elif self.state in (OPENING, CLOSING):
+            step = self.ramp * dt * (1 if self.state == OPENING else -1)
+            self.open_pct = min(100.0, max(0.0, self.open_pct + step))
+            if self.target is not None:
+                if (self.state == OPENING and self.open_pct >= self.target) or \
+                   (self.state == CLOSING and self.open_pct <= self.target):
+                    self.state = READY
+            else:
+                self.remain -= dt
+                if self.remain <= 0:
+                    self.state, self.remain = READY, 0
+        elif self.state == PREPARING and now >= self.phase_until:
+            self.state = SUPPLYING
+        elif self.state == SUPPLYING:
+            self.remain -= dt
+            if self.remain <= 0:
+                self.state, self.remain, self.phase_until = FINISHING, 0, now + 2.0
+        elif self.state == FINISHING and now >= self.phase_until:
+            self.state = READY
+        self.publish()
+
+    def publish(self):
+        """내부 상태 → 상태 레지스터"""
+        base, st = self.state_addr, self.status
+        self.regs.write(self.unit, base + st["state"], [self.state])
+        self.regs.write(self.unit, base + st["opid"], [self.opid])
+        self.regs.set_i32(self.unit, base + st["remain"], math.ceil(max(self.remain, 0)))
+        if "open_pct" in st:
+            self.regs.write(self.unit, base + st["open_pct"], [int(round(self.open_pct))])
+        if "area" in st:
+            self.regs.write(self.unit, base + st["area"], [self.area])
+            self.regs.write(self.unit, base + st["alarm"], [0])
+
+
+class SimSensors:
+    """register_map의 float32 값 레지스터를 하루 주기 + 잡음으로 채운다 (구동기 블록과 겹치는 주소는 건드리지 않음)"""
+    def __init__(self, register_map: dict, regs: Registers, owned: set[tuple[int, int]], seed: int | None = None):
+        self.regs = regs
+        self.rng = random.Random(seed)
+        self.fields: list[tuple[int, int, str, tuple[float, float]]] = []
+        self.status: list[tuple[int, int]] = []
+        for unit, info in (register_map.get("devices") or {}).items():
+            for name, item in (info.get("values") or {}).items():
+                addr = item.get("addr")
+                if not isinstance(addr, list) or item.get("dtype") != "float32":
+                    continue
+                if (int(unit), addr[0]) in owned:
+                    continue
+                rng = next((r for key, r in SENSOR_RANGES if key in name), (0.0, 100.0))
+                self.fields.append((int(unit), addr[0], name, rng))
+            for item in (info.get("status") or {}).values():
+                self.status.append((int(unit), item["addr"]))
+
+    def tick(self):
+        # 06시 최저 → 14시 최고
+        hour = time.localtime().tm_hour + time.localtime().tm_min / 60
+        day = (1 - math.cos((hour - 2) / 24 * 2 * math.pi)) / 2
+        for unit, addr, name, (lo, hi) in self.fields:
+            if "solar" in name:
+                frac = max(0.0, math.sin((hour - 6) / 12 * math.pi))
+            elif "humidity" in name:
+                frac = 1 - day      # 기온과 반대로
+            else:
+                frac = day
+            v = lo + (hi - lo) * frac
+            v += self.rng.gauss(0, (hi - lo) * 0.01)
+            self.regs.set_f32(unit, addr, v)
+        for unit, addr in self.status:
+            self.regs.write(unit, addr, [0])      # 0 = 정상
+
+
+class ModbusSimulator:
+    def __init__(self, act_conf: dict, register_map: dict, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 error_rate: float = 0.0, drop_rate: float = 0.0, fc23: bool = True,
+                 ack_delay: float = 0.3, ramp_pct_per_sec: float = 2.0, seed: int | None = None):
+        self.regs = Registers()
+        self.actuators = [SimActuator(name, reg, self.regs, ack_delay, ramp_pct_per_sec)
+                          for name, reg in (act_conf.get("devices") or {}).items()]
+        owned = set()
+        for a in self.actuators:
+            owned.update((a.unit, a.state_addr + i) for i in range(8))
+        self.sensors = SimSensors(register_map, self.regs, owned, seed)
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.fc23 = fc23
+        self.rng = random.Random(seed)
+        self.bus = asyncio.Lock()       # 실제 RS-485 버스처럼 한 번에 한 트랜잭션
+        self.stats = Counter()
+        self.clients = 0
+
+    # ---- 상태 갱신 ----
+    async def run_model(self, dt: float = 0.1):
+        last_sensor = 0.0
+        while True:
+            for a in self.actuators:
+                a.tick(dt)
+            if time.monotonic() - last_sensor >= 1.0:
+                self.sensors.tick()
+                last_sensor = time.monotonic()
+            await asyncio.sleep(dt)
+
+    def _after_write(self, unit: int, addr: int, count: int):
+        for a in self.actuators:
+            if a.covers(unit, addr, count):
+                a.on_write()
+
+    # ---- PDU 처리 ----
+    def handle_pdu(self, unit: int, pdu: bytes) -> bytes:
+        fc = pdu[0]
+        self.stats[f"fc{fc}"] += 1
+        try:
+            if fc == 3:
+                addr, count = struct.unpack(">HH", pdu[1:5])
+                if not 1 <= count <= 125:
+                    return self._exc(fc, ILLEGAL_VALUE)
+                if addr + count > 65536:
+                    return self._exc(fc, ILLEGAL_ADDRESS)
+                return self._regs_resp(fc, self.regs.read(unit, addr, count))
+            if fc == 6:
+                addr, value = struct.unpack(">HH", pdu[1:5])
+                self.regs.write(unit, addr, [value])
+                self._after_write(unit, addr, 1)
+                return pdu[:5]
+            if fc == 16:
+                addr, count, nbytes = struct.unpack(">HHB", pdu[1:6])
+                if not 1 <= count <= 123 or nbytes != count * 2:
+                    return self._exc(fc, ILLEGAL_VALUE)
+                self.regs.write(unit, addr, list(struct.unpack(f">{count}H", pdu[6:6 + nbytes])))
+                self._after_write(unit, addr, count)
+                return struct.pack(">BHH", fc, addr, count)
+            if fc == 23:
+                if not self.fc23:
+                    return self._exc(fc, ILLEGAL_FUNCTION)
+                raddr, rcount, waddr, wcount, nbytes = struct.unpack(">HHHHB", pdu[1:10])
+                if not 1 <= rcount <= 125 or not 1 <= wcount <= 121 or nbytes != wcount * 2:
+                    return self._exc(fc, ILLEGAL_VALUE)
+                # 쓰기가 먼저, 읽기는 그 다음 (규격)
+                self.regs.write(unit, waddr, list(struct.unpack(f">{wcount}H", pdu[10:10 + nbytes])))
+                self._after_write(unit, waddr, wcount)
+                for a in self.actuators:   # 명령 반영을 바로 읽을 수 있도록 상태 레지스터도 갱신
+                    a.tick(0.0)
+                return self._regs_resp(fc, self.regs.read(unit, raddr, rcount))
+        except struct.error:
+            return self._exc(fc, ILLEGAL_VALUE)
+        return self._exc(fc, ILLEGAL_FUNCTION)
+
+    def _regs_resp(self, fc: int, values: list[int]) -> bytes:
+        return struct.pack(f">BB{len(values)}H", fc, len(values) * 2, *values)
+
+    def _exc(self, fc: int, code: int) -> bytes:
+        self.stats[f"exception{code}"] += 1
+        return struct.pack(">BB", fc | 0x80, code)
+
+    # ---- TCP ----
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        peer = writer.get_extra_info("peername")
+        self.clients += 1
+        print(f"[sim] 접속 {peer}")
+        try:
+            while True:
+                header = await reader.readexactly(7)
+                tid, proto, length, unit = struct.unpack(">HHHB", header)
+                pdu = await reader.readexactly(length - 1)
+                async with self.bus:
+                    delay = self.latency + (self.rng.uniform(-self.jitter, self.jitter) if self.jitter else 0.0)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    if self.drop_rate and self.rng.random() < self.drop_rate:
+                        self.stats["dropped"] += 1
+                        continue                    # 응답 없음 → 클라이언트 타임아웃
+                    if self.error_rate and self.rng.random() < self.error_rate:
+                        resp = self._exc(pdu[0], DEVICE_FAILURE)
+                    else:
+                        resp = self.handle_pdu(unit, pdu)
+                writer.write(struct.pack(">HHHB", tid, proto, len(resp) + 1, unit) + resp)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            self.clients -= 1
+            print(f"[sim] 접속 종료 {peer}")
+            writer.close()
+
+    async def report(self, every: float):
+        last = Counter()
+        while True:
+            await asyncio.sleep(every)
+            cur = Counter(self.stats)
+            diff = {k: v - last.get(k, 0) for k, v in cur.items() if v - last.get(k, 0)}
+            total = sum(v for k, v in diff.items() if k.startswith("fc"))
+            print(f"[sim] {total / every:.1f} tx/s clients={self.clients} {diff} "
+                  f"commands={sum(a.commands for a in self.actuators)}")
+            last = cur
+
+
+async def main():
+    ap = argparse.ArgumentParser(description="Modbus TCP 온실 게이트웨이 시뮬레이터")
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("--port", type=int, default=5020)
+    ap.add_argument("--act-conf", default=str(DEFAULT_ACT_CONF))
+    ap.add_argument("--register-map", default=str(DEFAULT_REGISTER_MAP))
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="트랜잭션당 지연")
+    ap.add_argument("--jitter-ms", type=float, default=0.0, help="지연 ± 흔들림")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="예외 응답(slave device failure) 비율 0~1")
+    ap.add_argument("--drop-rate", type=float, default=0.0, help="응답하지 않는 비율 0~1")
+    ap.add_argument("--no-fc23", action="store_true", help="FC23을 illegal function으로 거부")
+    ap.add_argument("--ack-delay", type=float, default=0.3, help="명령 후 opid가 상태에 반영되기까지(초)")
+    ap.add_argument("--ramp", type=float, default=2.0, help="개폐 속도(%%/초)")
+    ap.add_argument("--stats-sec", type=float, default=10.0, help="처리량 출력 주기(0이면 끔)")
+    ap.add_argument("--seed", type=int, default=None)
+    args = ap.parse_args()
+
+    act_conf = yaml.safe_load(Path(args.act_conf).read_text(encoding="utf-8"))
+    register_map = yaml.safe_load(Path(args.register_map).read_text(encoding="utf-8"))
+    sim = ModbusSimulator(act_conf, register_map, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                          error_rate=args.error_rate, drop_rate=args.drop_rate, fc23=not args.no_fc23,
+                          ack_delay=args.ack_delay, ramp_pct_per_sec=args.ramp, seed=args.seed)
+    sim.sensors.tick()
+    server = await asyncio.start_server(sim.handle_client, args.host, args.port)
+    print(f"[sim] Modbus TCP 시뮬레이터 {args.host}:{args.port} "
+          f"(구동기 {len(sim.actuators)}개, 센서 값 {len(sim.sensors.fields)}개, fc23={sim.fc23})")
+    tasks = [asyncio.create_task(sim.run_model())]
+    if args.stats_sec > 0:
+        tasks.append(asyncio.create_task(sim.report(args.stats_sec)))
+    async with server:
+        await server.serve_forever()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,359 @@
+# 실행: python modbus_broker.py --gateway 192.168.0.10:502 --port 5020
+#   (또는 환경변수 MODBUS_GATEWAY, BROKER_PORT, BROKER_HTTP_PORT, MODBUS_ROUTES="5=192.168.0.11:502,6=...")
+#   compose: db_sensor_compose/timescale_db/compose.yaml 의 modbus_broker 서비스
+#   action I/O / 센서 폴러: 환경변수 MODBUS_IP/MODBUS_PORT 를 브로커 주소로 (compose에서 설정)
+#
+# 게이트웨이 연결을 브로커 하나가 갖고, 센서 폴러와 action I/O의 Modbus TCP 요청을 받아 차례로 흘려보낸다 (표준 라이브러리 asyncio만 사용)
+# - 쓰기(FC 5/6/15/16/23)는 대기중인 읽기보다 항상 먼저 (센서 전체 읽기가 구동기 명령을 막지 않게)
+# - 같은 우선순위 안에서는 접속(클라이언트)별 큐를 돌아가며 하나씩 (한 클라이언트가 큐를 독차지하지 않게)
+# - 게이트웨이에는 한 번에 한 트랜잭션만 (RS-485 버스 뒤의 게이트웨이는 어차피 순차 처리)
+# - transaction id는 브로커가 다시 매기고 응답을 원래 클라이언트의 id로 돌려준다
+# - 게이트웨이가 응답하지 않으면 0x0B(gateway target failed to respond), 연결이 안 되면 0x0A(gateway path unavailable)
+# - 큐 깊이/대기 시간/지연은 --stats-sec 주기로 출력하고 --http-port 의 GET /stats 로 JSON 조회
+#
+# slave(unit)마다 게이트웨이가 다르면 --route 5=192.168.0.11:502 (여러 번 가능)
+
+import argparse, asyncio, itertools, json, os, struct, time
+from collections import Counter, deque
+
+# 우선순위 (숫자가 작을수록 먼저)
+PRIORITY_WRITE = 0
+PRIORITY_READ = 1
+WRITE_FCS = {5, 6, 15, 16, 23}
+
+# Modbus 예외 코드 (게이트웨이용)
+GATEWAY_PATH_UNAVAILABLE = 0x0A
+GATEWAY_TARGET_NO_RESPONSE = 0x0B
+
+
+class GatewayDown(Exception):
+    """게이트웨이에 연결할 수 없음 (재접속 대기 중 포함)"""
+
+
+def parse_hostport(spec: str, default_port: int = 502) -> tuple[str, int]:
+    host, _, port = spec.partition(":")
+    return host, int(port or default_port)
+
+
+def exception_pdu(fc: int, code: int) -> bytes:
+    return struct.pack(">BB", (fc & 0x7F) | 0x80, code)
+
+
+class Request:
+    __slots__ = ("client", "tid", "unit", "pdu", "priority", "queued_at")
+
+    def __init__(self, client: "Client", tid: int, unit: int, pdu: bytes):
+        self.client = client
+        self.tid = tid
+        self.unit = unit
+        self.pdu = pdu
+        self.priority = PRIORITY_WRITE if pdu[0] in WRITE_FCS else PRIORITY_READ
+        self.queued_at = time.monotonic()
+
+
+class Client:
+    """브로커에 붙은 TCP 접속 하나 (센서 폴러, action I/O ...)"""
+    def __init__(self, cid: int, peer, writer: asyncio.StreamWriter):
+        self.cid = cid
+        self.peer = peer
+        self.writer = writer
+        self.closed = False
+        self.stats = Counter()
+        self.max_wait_sec = 0.0
+
+    @property
+    def name(self) -> str:
+        return f"{self.cid}@{self.peer[0]}:{self.peer[1]}" if self.peer else str(self.cid)
+
+    def reply(self, req: Request, pdu: bytes):
+        if self.closed:
+            return
+        self.writer.write(struct.pack(">HHHB", req.tid, 0, len(pdu) + 1, req.unit) + pdu)
+
+
+class Upstream:
+    """
+    게이트웨이 하나와의 연결 + 우선순위별, 클라이언트별 대기열.
+    dispatcher가 쓰기 대기열부터, 클라이언트를 돌아가며 하나씩 꺼내 게이트웨이에 보낸다.
+    """
+    def __init__(self, host: str, port: int, timeout: float = 3.0, max_wait: float = 5.0,
+                 backoff_min: float = 0.5, backoff_max: float = 30.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout          # 게이트웨이 응답 최대 대기(초)
+        self.max_wait = max_wait        # 큐에서 이보다 오래 기다린 요청은 게이트웨이에 보내지 않고 0x0B로 바로 답한다
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        # 우선순위 → {클라이언트 id → deque[Request]}, 돌아가는 순서는 rr 목록
+        self.queues: dict[int, dict[int, deque]] = {PRIORITY_WRITE: {}, PRIORITY_READ: {}}
+        self.rr: dict[int, deque] = {PRIORITY_WRITE: deque(), PRIORITY_READ: deque()}
+        self.wake = asyncio.Event()
+        self.reader: asyncio.StreamReader | None = None
+        self.writer: asyncio.StreamWriter | None = None
+        self._tid = itertools.count(1)
+        self._backoff = backoff_min
+        self._next_attempt = 0.0
+        self.in_flight: Request | None = None
+        # 메트릭
+        self.stats = Counter()
+        self.max_wait_sec = {PRIORITY_WRITE: 0.0, PRIORITY_READ: 0.0}
+        self.last_latency_sec = 0.0
+        self.connected_since: float | None = None
+
+    @property
+    def key(self) -> str:
+        return f"{self.host}:{self.port}"
+
+    @property
+    def connected(self) -> bool:
+        return self.writer is not None and not self.writer.is_closing()
+
+    def depth(self, priority: int | None = None) -> int:
+        prios = self.queues if priority is None else [priority]
+        return sum(len(q) for p in prios for q in self.queues[p].values())
+
+    def submit(self, req: Request):
+        queues = self.queues[req.priority]
+        if req.client.cid not in queues:
+            queues[req.client.cid] = deque()
+            self.rr[req.priority].append(req.client.cid)
+        queues[req.client.cid].append(req)
+        self.wake.set()
+
+    def forget(self, client: Client):
+        # 접속이 끊긴 클라이언트의 대기 요청은 버린다
+        for p in self.queues:
+            q = self.queues[p].pop(client.cid, None)
+            if q:
+                self.stats["abandoned"] += len(q)
+            if client.cid in self.rr[p]:
+                self.rr[p].remove(client.cid)
+
+    def _next(self) -> Request | None:
+        # 쓰기 우선(strict), 같은 우선순위는 클라이언트 round-robin
+        for p in (PRIORITY_WRITE, PRIORITY_READ):
+            order = self.rr[p]
+            while order:
+                cid = order.popleft()
+                q = self.queues[p].get(cid)
+                if not q:
+                    self.queues[p].pop(cid, None)
+                    continue
+                req = q.popleft()
+                if q:
+                    order.append(cid)   # 남은 요청이 있으면 줄 맨 뒤로
+                else:
+                    del self.queues[p][cid]
+                return req
+        return None
+
+    async def _connect(self):
+        wait = self._next_attempt - time.monotonic()
+        if wait > 0:
+            raise GatewayDown(f"{self.key} down, retry in {wait:.1f}s")
+        try:
+            self.reader, self.writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            self.stats["connect_failures"] += 1
+            self._next_attempt = time.monotonic() + self._backoff
+            print(f"[broker] {self.key} 연결 실패 ({e!r}), {self._backoff:.1f}s 후 재시도")
+            self._backoff = min(self._backoff * 2, self.backoff_max)
+            raise GatewayDown(f"{self.key} connect failed") from e
+        if self.stats["connects"]:
+            self.stats["reconnects"] += 1
+        self.stats["connects"] += 1
+        self._backoff = self.backoff_min
+        self.connected_since = time.time()
+        print(f"[broker] {self.key} 연결됨")
+
+    def _drop(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+        self.connected_since = None
+
+    async def _transact(self, req: Request) -> bytes:
+        if not self.connected:
+            await self._connect()
+        tid = next(self._tid) & 0xFFFF
+        self.writer.write(struct.pack(">HHHB", tid, 0, len(req.pdu) + 1, req.unit) + req.pdu)
+        await self.writer.drain()
+        deadline = time.monotonic() + self.timeout
+        while True:
+            header = await asyncio.wait_for(self.reader.readexactly(7), max(0.0, deadline - time.monotonic()))
+            rtid, _, length, _ = struct.unpack(">HHHB", header)
+            pdu = await asyncio.wait_for(self.reader.readexactly(length - 1), max(0.0, deadline - time.monotonic()))
+            if rtid == tid:
+                return pdu
+            self.stats["stale_responses"] += 1     # 앞에서 타임아웃 난 요청의 늦은 응답
+
+    async def run(self):
+        while True:
+            req = self._next()
+            if req is None:
+                self.wake.clear()
+                await self.wake.wait()
+                continue
+            if req.client.closed:
+                self.stats["abandoned"] += 1
+                continue
+            now = time.monotonic()
+            waited = now - req.queued_at
+            self.max_wait_sec[req.priority] = max(self.max_wait_sec[req.priority], waited)
+            req.client.max_wait_sec = max(req.client.max_wait_sec, waited)
+            if waited > self.max_wait:
+                # 버스에 내보내지는 않되 답은 준다 (안 주면 클라이언트가 자기 타임아웃까지 기다림)
+                self.stats["expired"] += 1
+                req.client.reply(req, exception_pdu(req.pdu[0], GATEWAY_TARGET_NO_RESPONSE))
+                continue
+            self.in_flight = req
+            try:
+                pdu = await self._transact(req)
+            except GatewayDown:
+                self.stats["unavailable"] += 1
+                pdu = exception_pdu(req.pdu[0], GATEWAY_PATH_UNAVAILABLE)
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError, OSError) as e:
+                # 응답 없음/끊김: 이 세션은 버리고 다음 요청 때 다시 연결
+                self.stats["timeouts" if isinstance(e, asyncio.TimeoutError) else "disconnects"] += 1
+                self._drop()
+                pdu = exception_pdu(req.pdu[0], GATEWAY_TARGET_NO_RESPONSE)
+            finally:
+                self.in_flight = None
+            self.last_latency_sec = time.monotonic() - now
+            self.stats["writes" if req.priority == PRIORITY_WRITE else "reads"] += 1
+            req.client.reply(req, pdu)
+
+    def snapshot(self) -> dict:
+        return {
+            "connected": self.connected,
+            "connected_since": self.connected_since,
+            "queued_writes": self.depth(PRIORITY_WRITE),
+            "queued_reads": self.depth(PRIORITY_READ),
+            "queued_by_client": {cid: sum(len(self.queues[p].get(cid) or ()) for p in self.queues)
+                                 for cid in set(self.queues[PRIORITY_WRITE]) | set(self.queues[PRIORITY_READ])},
+            "busy": self.in_flight is not None,
+            "max_wait_sec": {"write": round(self.max_wait_sec[PRIORITY_WRITE], 3),
+                             "read": round(self.max_wait_sec[PRIORITY_READ], 3)},
+            "last_latency_sec": round(self.last_latency_sec, 4),
+            **self.stats,
+        }
+
+
+class ModbusBroker:
+    def __init__(self, gateway: tuple[str, int], routes: dict[int, tuple[str, int]] | None = None, **upstream_kw):
+        self.upstreams: dict[str, Upstream] = {}
+        self.default = self._upstream(*gateway, **upstream_kw)
+        self.routes = {unit: self._upstream(*gw, **upstream_kw) for unit, gw in (routes or {}).items()}
+        self.clients: dict[int, Client] = {}
+        self._cid = itertools.count(1)
+
+    def _upstream(self, host: str, port: int, **kw) -> Upstream:
+        key = f"{host}:{port}"
+        if key not in self.upstreams:
+            self.upstreams[key] = Upstream(host, port, **kw)
+        return self.upstreams[key]
+
+    def route(self, unit: int) -> Upstream:
+        return self.routes.get(unit, self.default)
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        client = Client(next(self._cid), writer.get_extra_info("peername"), writer)
+        self.clients[client.cid] = client
+        print(f"[broker] 접속 {client.name}")
+        try:
+            while True:
+                header = await reader.readexactly(7)
+                tid, proto, length, unit = struct.unpack(">HHHB", header)
+                pdu = await reader.readexactly(length - 1)
+                if proto != 0 or not pdu:
+                    break
+                client.stats["requests"] += 1
+                self.route(unit).submit(Request(client, tid, unit, pdu))
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            client.closed = True
+            for up in self.upstreams.values():
+                up.forget(client)
+            del self.clients[client.cid]
+            print(f"[broker] 접속 종료 {client.name}")
+            writer.close()
+
+    def snapshot(self) -> dict:
+        return {
+            "gateways": {key: up.snapshot() for key, up in self.upstreams.items()},
+            "clients": {c.name: {**c.stats, "max_wait_sec": round(c.max_wait_sec, 3)} for c in self.clients.values()},
+        }
+
+    async def report(self, every: float):
+        last = Counter()
+        while True:
+            await asyncio.sleep(every)
+            cur = Counter()
+            for up in self.upstreams.values():
+                cur["reads"] += up.stats["reads"]
+                cur["writes"] += up.stats["writes"]
+            rate = {k: round((v - last.get(k, 0)) / every, 1) for k, v in cur.items()}
+            depth = {key: (up.depth(PRIORITY_WRITE), up.depth(PRIORITY_READ)) for key, up in self.upstreams.items()}
+            print(f"[broker] tx/s {rate} 대기(쓰기, 읽기) {depth} 클라이언트 {len(self.clients)}")
+            last = cur
+
+    async def handle_http(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # GET /stats 만 지원하는 최소 HTTP (healthcheck/메트릭 수집용)
+        try:
+            line = await asyncio.wait_for(reader.readline(), 2)
+            while (await asyncio.wait_for(reader.readline(), 2)) not in (b"\r\n", b"\n", b""):
+                pass
+            path = line.split()[1].decode() if len(line.split()) > 1 else "/"
+            if path.startswith("/stats") or path.startswith("/health"):
+                body, status = json.dumps(self.snapshot(), ensure_ascii=False).encode(), "200 OK"
+            else:
+                body, status = b'{"detail": "not found"}', "404 Not Found"
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                         f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError, IndexError):
+            pass
+        finally:
+            writer.close()
+
+
+async def main():
+    ap = argparse.ArgumentParser(description="Modbus TCP 게이트웨이 브로커 (쓰기 우선, 클라이언트별 공정 분배)")
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("--port", type=int, default=int(os.getenv("BROKER_PORT", "5020")))
+    ap.add_argument("--gateway", default=os.getenv("MODBUS_GATEWAY", "192.168.0.10:502"),
+                    help="기본 게이트웨이 host:port (기본값: $MODBUS_GATEWAY)")
+    ap.add_argument("--route", action="append",
+                    default=[r.strip() for r in os.getenv("MODBUS_ROUTES", "").split(",") if r.strip()],
+                    help="slave별 게이트웨이 UNIT=host:port (기본값: $MODBUS_ROUTES, 쉼표로 구분)")
+    ap.add_argument("--timeout", type=float, default=3.0, help="게이트웨이 응답 최대 대기(초)")
+    ap.add_argument("--max-wait", type=float, default=5.0, help="큐에서 이보다 오래 기다린 요청은 버림(초)")
+    ap.add_argument("--backoff-max", type=float, default=30.0, help="게이트웨이 재접속 대기 상한(초)")
+    ap.add_argument("--http-port", type=int, default=int(os.getenv("BROKER_HTTP_PORT", "0")),
+                    help="GET /stats 포트 (0이면 끔, 기본값: $BROKER_HTTP_PORT)")
+    ap.add_argument("--stats-sec", type=float, default=60.0, help="큐 깊이/처리량 출력 주기(0이면 끔)")
+    args = ap.parse_args()
+
+    routes = {}
+    for r in args.route:
+        unit, _, gw = r.partition("=")
+        routes[int(unit)] = parse_hostport(gw)
+    broker = ModbusBroker(parse_hostport(args.gateway), routes, timeout=args.timeout,
+                          max_wait=args.max_wait, backoff_max=args.backoff_max)
+    server = await asyncio.start_server(broker.handle_client, args.host, args.port)
+    print(f"[broker] {args.host}:{args.port} → {list(broker.upstreams)} (route {routes or '-'})")
+    tasks = [asyncio.create_task(up.run()) for up in broker.upstreams.values()]
+    if args.http_port:
+        await asyncio.start_server(broker.handle_http, args.host, args.http_port)
+        print(f"[broker] stats http://{args.host}:{args.http_port}/stats")
+    if args.stats_sec > 0:
+        tasks.append(asyncio.create_task(broker.report(args.stats_sec)))
+    async with server:
+        await server.serve_forever()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
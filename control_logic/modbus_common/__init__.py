@@ -0,0 +1,5 @@
+# action I/O와 센서 폴러가 같이 쓰는 Modbus 모듈 (한 곳에서만 고친다)
+#   - modbus_conn: 게이트웨이 연결 / 재접속 backoff / health check
+#   - regcodec:    레지스터 블록 ↔ 값 디코딩/인코딩
+#   - read_plan:   흩어진 레지스터를 적은 수의 읽기 요청으로 묶기
+# 컨테이너에는 Dockerfile이 /app/modbus_common 으로 복사 (compose의 additional_contexts: modbus_common)
@@ -0,0 +1,206 @@
+import asyncio, contextlib, time
+from typing import Awaitable, Callable
+from pymodbus.client import AsyncModbusTcpClient
+
+class GatewayUnavailable(ConnectionError):
+    """게이트웨이에 연결되어 있지 않고 재접속 대기(backoff) 중일 때"""
+
+
+class GatewayConnection:
+    """
+    게이트웨이(host:port) 하나와의 Modbus TCP 연결.
+    - ensure(): 끊겨 있으면 다시 연결 (실패하면 backoff_min → backoff_max 까지 두 배씩 늘려가며 재시도)
+    - record_failure(): 연속 실패가 max_failures번이면 연결을 끊고 다시 맺는다 (반쯤 죽은 세션 정리)
+    - 백그라운드 health check: health_interval마다 끊겨 있으면 재접속, 붙어 있으면 probe 레지스터를 읽어본다
+      (트랜스포트가 있으면 그 큐로 읽기 우선순위로 보내고, 없으면 transaction() 중인 읽기가 없을 때만 직접 읽는다)
+    """
+    def __init__(self, host: str, port: int = 502, timeout: float = 3.0,
+                 backoff_min: float = 0.5, backoff_max: float = 30.0, max_failures: int = 3,
+                 health_interval: float = 10.0, probe: tuple[int, int] | None = None):
+        self.host = host
+        self.port = int(port)
+        self.timeout = timeout
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        self.max_failures = max_failures
+        self.health_interval = health_interval
+        self.probe = probe                      # (device_id, 주소): health check 때 읽어볼 레지스터
+        self.client: AsyncModbusTcpClient | None = None
+        self.state = "down"                     # down / connecting / up
+        self._backoff = backoff_min
+        self._next_attempt = 0.0                # time.monotonic(), 이 전에는 재접속 시도 안 함
+        self._failures = 0                      # 연속 실패 수
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        self._last_used = 0.0
+        self.in_flight = 0                      # transaction() 안에서 클라이언트를 쓰는 중인 수
+        self.prober: Callable[[int, int], Awaitable] | None = None   # ModbusTransport가 자기 큐로 probe를 보내도록 설정
+        # 메트릭
+        self.connects = 0
+        self.reconnects = 0
+        self.connect_failures = 0
+        self.total_failures = 0
+        self.last_error: str | None = None
+        self.connected_since: float | None = None   # epoch
+
+    @property
+    def key(self) -> str:
+        return f"{self.host}:{self.port}"
+
+    @property
+    def connected(self) -> bool:
+        return self.client is not None and self.client.connected
+
+    async def ensure(self) -> AsyncModbusTcpClient:
+        """연결된 클라이언트를 돌려준다. 재접속 대기 중이거나 연결이 안 되면 GatewayUnavailable"""
+        self._last_used = time.monotonic()
+        if self.connected:
+            return self.client
+        async with self._lock:
+            if self.connected:
+                return self.client
+            wait = self._next_attempt - time.monotonic()
+            if wait > 0:
+                raise GatewayUnavailable(f"{self.key} down, retry in {wait:.1f}s ({self.last_error})")
+            await self._connect()
+            return self.client
+
+    async def _connect(self):
+        self.state = "connecting"
+        if self.client is not None:
+            self.client.close()
+        # pymodbus 자체 재접속은 끄고(reconnect_delay=0) 여기서 backoff로 관리
+        self.client = AsyncModbusTcpClient(self.host, port=self.port, timeout=self.timeout, retries=0, reconnect_delay=0)
+        try:
+            ok = await asyncio.wait_for(self.client.connect(), self.timeout)
+        except (asyncio.TimeoutError, OSError) as e:
+            ok, self.last_error = False, repr(e)
+        if not ok:
+            self.connect_failures += 1
+            self.last_error = self.last_error or "connect failed"
+            self.state = "down"
+            self._next_attempt = time.monotonic() + self._backoff
+            print(f"[modbus] {self.key} 연결 실패, {self._backoff:.1f}s 후 재시도")
+            self._backoff = min(self._backoff * 2, self.backoff_max)
+            raise GatewayUnavailable(f"{self.key} connect failed")
+        if self.connects:
+            self.reconnects += 1
+        self.connects += 1
+        self.state = "up"
+        self._backoff = self.backoff_min
+        self._failures = 0
+        self.connected_since = time.time()
+        print(f"[modbus] {self.key} 연결됨 (재접속 {self.reconnects}회)")
+
+    def record_success(self):
+        self._failures = 0
+
+    def record_failure(self, exc: BaseException):
+        """트랜잭션 실패를 기록. 연결이 끊겼거나 연속 실패가 쌓이면 세션을 버리고 다음 ensure()에서 다시 연결"""
+        self._failures += 1
+        self.total_failures += 1
+        self.last_error = repr(exc)
+        if not self.connected or self._failures >= self.max_failures:
+            self.drop()
+
+    def drop(self):
+        if self.client is not None:
+            self.client.close()
+        self.state = "down"
+        self.connected_since = None
+        self._failures = 0
+
+    async def start(self):
+        try:
+            await self.ensure()
+        except GatewayUnavailable as e:
+            print(f"[modbus] {e} (백그라운드에서 재시도)")
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._health_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+        self.drop()
+
+    @contextlib.asynccontextmanager
+    async def transaction(self):
+        """ensure()로 클라이언트를 받아 쓰는 동안 in_flight로 표시 (그동안 health probe는 건너뜀)"""
+        client = await self.ensure()
+        self.in_flight += 1
+        try:
+            yield client
+        finally:
+            self.in_flight -= 1
+            self._last_used = time.monotonic()
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            try:
+                if not self.connected:
+                    await self.ensure()
+                elif (self.probe is not None and self.in_flight == 0
+                      and time.monotonic() - self._last_used >= self.health_interval):
+                    # 한동안 안 쓴 연결이 살아 있는지 확인
+                    device_id, addr = self.probe
+                    if self.prober is not None:
+                        # 트랜스포트 큐를 거친다 (성공/실패 기록도 트랜스포트가 함)
+                        try:
+                            await self.prober(device_id, addr)
+                        except Exception as e:
+                            print(f"[modbus] {self.key} health check 실패: {e!r}")
+                        continue
+                    async with self.transaction() as client:
+                        rr = await asyncio.wait_for(client.read_holding_registers(addr, count=1, device_id=device_id),
+                                                    self.timeout)
+                    if rr.isError():
+                        raise ConnectionError(f"probe error response: {rr}")
+                    self.record_success()
+            except GatewayUnavailable:
+                pass
+            except Exception as e:
+                print(f"[modbus] {self.key} health check 실패: {e!r}")
+                self.record_failure(e)
+
+    def stats(self) -> dict:
+        return {
+            "state": "up" if self.connected else self.state,
+            "connects": self.connects,
+            "reconnects": self.reconnects,
+            "connect_failures": self.connect_failures,
+            "failures": self.total_failures,
+            "last_error": self.last_error,
+            "connected_since": self.connected_since,
+            "retry_in_sec": round(max(0.0, self._next_attempt - time.monotonic()), 1) if not self.connected else None,
+        }
+
+
+class ConnectionManager:
+    """host:port 별 GatewayConnection을 하나씩만 만들어 공유 (구역마다 다른 게이트웨이를 쓸 수 있게)"""
+    def __init__(self, **defaults):
+        self.defaults = defaults                # GatewayConnection 생성 인자 기본값 (timeout, backoff_max 등)
+        self.conns: dict[str, GatewayConnection] = {}
+
+    def get(self, host: str, port: int = 502, **kwargs) -> GatewayConnection:
+        key = f"{host}:{int(port)}"
+        if key not in self.conns:
+            self.conns[key] = GatewayConnection(host, port, **{**self.defaults, **kwargs})
+        return self.conns[key]
+
+    async def start(self):
+        await asyncio.gather(*(c.start() for c in self.conns.values()))
+
+    async def stop(self):
+        await asyncio.gather(*(c.stop() for c in self.conns.values()))
+
+    def stats(self) -> dict:
+        return {key: c.stats() for key, c in self.conns.items()}
+
+
+def parse_gateway(spec: str | None, default_port: int = 502) -> tuple[str, int] | None:
+    """'192.168.0.11:502' 또는 '192.168.0.11' → (host, port)"""
+    if not spec:
+        return None
+    host, _, port = str(spec).partition(":")
+    return host, int(port or default_port)
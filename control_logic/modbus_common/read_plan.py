@@ -0,0 +1,48 @@
+from dataclasses import dataclass, field
+
+# FC3(read holding registers) 한 번에 읽을 수 있는 최대 레지스터 수
+MAX_READ_COUNT = 125
+
+@dataclass
+class ReadRequest:
+    device_id: int
+    start: int
+    count: int
+    members: list[str] = field(default_factory=list)   # 이 블록에서 잘라 쓰는 항목 이름
+
+    @property
+    def end(self) -> int:
+        return self.start + self.count
+
+    def slice(self, regs: list[int], start: int, count: int) -> list[int]:
+        """블록 전체를 읽은 regs에서 start 주소부터 count개를 잘라낸다."""
+        off = start - self.start
+        return regs[off:off + count]
+
+
+def plan_reads(spans: dict[str, tuple[int, int, int]], max_gap: int = 50,
+               max_count: int = MAX_READ_COUNT) -> list[ReadRequest]:
+    """
+    spans: 이름 → (device_id, 시작주소, 개수)
+    같은 slave(device_id)에서 사이 간격이 max_gap 이하이고 합친 길이가 max_count 이하인 구간을
+    하나의 ReadRequest로 묶는다. 사이에 낀 레지스터도 같이 읽지만 트랜잭션 수가 줄어든다.
+    """
+    by_dev: dict[int, list[tuple[int, int, str]]] = {}
+    for name, (device_id, start, count) in spans.items():
+        by_dev.setdefault(int(device_id), []).append((int(start), int(count), name))
+
+    plan: list[ReadRequest] = []
+    for device_id in sorted(by_dev):
+        cur: ReadRequest | None = None
+        for start, count, name in sorted(by_dev[device_id]):
+            if cur is not None:
+                end = max(cur.end, start + count)
+                if start - cur.end <= max_gap and end - cur.start <= max_count:
+                    cur.count = end - cur.start
+                    cur.members.append(name)
+                    continue
+                plan.append(cur)
+            cur = ReadRequest(device_id, start, count, [name])
+        if cur is not None:
+            plan.append(cur)
+    return plan
@@ -0,0 +1,88 @@
+import struct
+from typing import Any
+
+# 레지스터 맵 dtype → struct 포맷 문자 (32비트 값은 하위 워드가 먼저: utils.pack_i32/pack_f32와 같은 배치)
+DTYPES = {
+    "uint16": "H",
+    "int16": "h",
+    "int32": "i",
+    "uint32": "I",
+    "float32": "f",
+}
+WIDTH = {"H": 1, "h": 1, "i": 2, "I": 2, "f": 2}    # 레지스터 수
+
+
+class BlockCodec:
+    """
+    count개짜리 레지스터 블록의 레이아웃을 struct.Struct 하나로 미리 컴파일해 둔다.
+    decode()는 블록 전체를 한 번에 풀어 {이름: 값}을, encode()는 반대로 레지스터 리스트를 만든다.
+    필드 사이에 비는 레지스터는 패드 바이트로 건너뛴다.
+    """
+    def __init__(self, fields: dict[str, tuple[int, str]], count: int | None = None):
+        # fields: 이름 → (블록 안 오프셋, dtype)
+        layout = sorted((off, name, DTYPES[dtype]) for name, (off, dtype) in fields.items())
+        end = max((off + WIDTH[fmt] for off, _, fmt in layout), default=0)
+        self.count = end if count is None else count
+        if end > self.count:
+            raise ValueError(f"fields need {end} registers but block has {self.count}")
+        fmt, pos = "<", 0
+        for off, name, ch in layout:
+            if off < pos:
+                raise ValueError(f"overlapping register field: {name} at offset {off}")
+            if off > pos:
+                fmt += f"{(off - pos) * 2}x"
+            fmt += ch
+            pos = off + WIDTH[ch]
+        if self.count > pos:
+            fmt += f"{(self.count - pos) * 2}x"
+        self.names = [name for _, name, _ in layout]
+        self._fields = struct.Struct(fmt)
+        self._regs = struct.Struct(f"<{self.count}H")
+
+    def decode(self, regs: list[int]) -> dict[str, Any]:
+        return dict(zip(self.names, self._fields.unpack(self._regs.pack(*regs[:self.count]))))
+
+    def encode(self, values: dict[str, Any]) -> list[int]:
+        # 빠진 필드와 패드 레지스터는 0
+        return list(self._regs.unpack(self._fields.pack(*(values.get(name) or 0 for name in self.names))))
+
+
+def compile_offsets(spec: dict[str, int | list[int]], dtypes: dict[str, str] | None = None,
+                    count: int | None = None) -> BlockCodec:
+    """
+    구동기 STATUS/CMD 같은 {이름: 오프셋 | [오프셋, 오프셋+1]} 딕셔너리를 컴파일.
+    dtype을 따로 안 주면 레지스터 하나는 uint16, 두 개는 int32
+    """
+    dtypes = dtypes or {}
+    fields = {}
+    for name, off in spec.items():
+        if isinstance(off, list):
+            fields[name] = (off[0], dtypes.get(name, "int32"))
+        else:
+            fields[name] = (off, dtypes.get(name, "uint16"))
+    return BlockCodec(fields, count)
+
+
+def register_fields(device_info: dict, groups: tuple[str, ...] = ("values", "status")) -> dict[str, tuple[int, str]]:
+    """register_map YAML의 장치 하나({values: {이름: {addr, dtype}}, status: {...}}) → 이름: (주소, dtype)"""
+    items = {}
+    for group in groups:
+        for name, info in (device_info.get(group) or {}).items():
+            addr = info.get("addr")
+            if isinstance(addr, list):
+                items[name] = (addr[0], info.get("dtype") or "int32")
+            else:
+                items[name] = (addr, info.get("dtype") or "uint16")
+    return items
+
+
+def compile_register_map(device_info: dict, groups: tuple[str, ...] = ("values", "status")) -> tuple[int, BlockCodec]:
+    """
+    register_map YAML의 장치 하나를 (시작 주소, 코덱)으로 컴파일.
+    블록은 가장 낮은 주소부터 가장 높은 주소까지
+    """
+    items = register_fields(device_info, groups)
+    if not items:
+        raise ValueError("no register addresses in device map")
+    start = min(addr for addr, _ in items.values())
+    return start, BlockCodec({name: (addr - start, dtype) for name, (addr, dtype) in items.items()})